@@ -0,0 +1,125 @@
+"""
+bench_extract.py — End-to-end extraction benchmark against mock_fudo_api.py.
+
+Usage:
+    python bench_extract.py --sales 20000 --latency 40 --workers 4
+    python bench_extract.py --modes sequential,slim --error-rate 0.02 --token-ttl 5
+
+Starts the mock API in-process, then runs each mode in a fresh process (so peak RSS
+is the extractor's own) through fetch_all_sales into a temporary directory, and
+reports wall time, sales/sec, bytes/sec served by the mock, requests and peak RSS.
+
+Modes:
+    sequential    one page at a time
+    concurrent    --workers pages in flight
+    slim          concurrent, reference catalogs joined locally (--slim)
+    incremental   concurrent, only the newest 10% of sales (--incremental)
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from urllib.request import urlopen
+
+import mock_fudo_api
+
+MODES = ["sequential", "concurrent", "slim", "incremental"]
+
+
+def run_mode(mode, api_base, auth_url, workers, rate, created_from, star, results):
+    """Child process: one extraction, reporting sales, seconds and peak RSS through ``results``."""
+    os.environ["FUDO_API_BASE"] = api_base
+    os.environ["FUDO_AUTH_URL"] = auth_url
+    import extract_fudo_sales as ex
+    from fudo_client import FudoClient
+
+    workers = 1 if mode == "sequential" else workers
+    client = FudoClient(ex.API_KEY, ex.API_SECRET, ex.API_BASE, ex.AUTH_URL,
+                        rate=rate, pool_size=max(4, workers * 2))
+    with tempfile.TemporaryDirectory() as tmp, redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        client.authenticate()
+        include, fields = ex.INCLUDES, None
+        catalogs = []
+        if mode == "slim":
+            for filename in ex.SLIM_CATALOGS:
+                path, inc = ex.REFERENCE_ENDPOINTS[filename]
+                catalogs.append(client.fetch_collection(path, include=inc))
+            include, fields = ex.SLIM_INCLUDES, ex.probe_sparse_fieldsets(client)
+        star_dir = os.path.join(tmp, "star") if star and ex.sales_star else None
+        with ex.SalesWriter(os.path.join(tmp, "sales.csv"), os.path.join(tmp, "raw.jsonl"),
+                            os.path.join(tmp, "entities.jsonl"), star_dir=star_dir) as writer:
+            for doc in catalogs:
+                writer.registry.add_catalog(doc)
+            ex.fetch_all_sales(client, writer, created_from=created_from if mode == "incremental" else None,
+                               workers=workers, include=include, fields=fields)
+        writer.finalize()
+        seconds = time.perf_counter() - start
+        client.close()
+    results.put({"sales": writer.sales, "seconds": seconds,
+                 "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024})
+
+
+def mock_stats(base):
+    with urlopen(f"{base}/_stats") as r:
+        return json.load(r)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the FUDO extractor against the local mock API.")
+    parser.add_argument("--sales", type=int, default=20000, help="synthetic sales served (default: 20000)")
+    parser.add_argument("--latency", type=float, default=20.0, help="mock latency per request, in ms (default: 20)")
+    parser.add_argument("--token-ttl", type=float, default=3600.0, help="mock token lifetime in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 429/503")
+    parser.add_argument("--meta-total", action="store_true", help="mock reports meta.total (skips page probing)")
+    parser.add_argument("--workers", type=int, default=4, help="workers for the concurrent modes (default: 4)")
+    parser.add_argument("--rate", type=float, default=1000.0,
+                        help="client rate limit in requests/second (default: 1000, effectively off)")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"comma-separated subset of {','.join(MODES)}")
+    parser.add_argument("--star", action="store_true", help="also write the Parquet star schema")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    server = mock_fudo_api.make_server(0, args.sales, args.latency, args.token_ttl, args.error_rate, args.meta_total)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    base = f"http://{host}:{port}"
+    created_from = mock_fudo_api.iso(mock_fudo_api.START + int(args.sales * 0.9) * mock_fudo_api.SALE_INTERVAL)
+
+    print(f"Mock API: {args.sales} sales, {args.latency:g} ms latency, error rate {args.error_rate:g}")
+    print(f"{'mode':<12} {'sales':>8} {'seconds':>8} {'sales/s':>9} {'MB/s':>7} {'requests':>9} {'errors':>7} {'peak RSS MB':>12}")
+    ctx = multiprocessing.get_context("spawn")
+    report = []
+    for mode in args.modes.split(","):
+        before = mock_stats(base)
+        results = ctx.Queue()
+        proc = ctx.Process(target=run_mode, args=(mode, f"{base}/v1alpha1", f"{base}/api", args.workers,
+                                                   args.rate, created_from, args.star, results))
+        proc.start()
+        result = results.get()
+        proc.join()
+        after = mock_stats(base)
+        n_bytes = after["bytes"] - before["bytes"]
+        errors = sum(n - before["status"].get(code, 0) for code, n in after["status"].items() if code != "200")
+        row = {"mode": mode, **result, "bytes": n_bytes, "requests": after["requests"] - before["requests"],
+               "errors": errors, "sales_per_sec": result["sales"] / result["seconds"],
+               "bytes_per_sec": n_bytes / result["seconds"]}
+        report.append(row)
+        print(f"{mode:<12} {row['sales']:>8} {row['seconds']:>8.2f} {row['sales_per_sec']:>9.0f} "
+              f"{row['bytes_per_sec'] / 1e6:>7.2f} {row['requests']:>9} {row['errors']:>7} {row['peak_rss_mb']:>12.1f}")
+    server.shutdown()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,34 @@
-import json
+"""
+convert_reference_data.py — Convert the reference catalogs downloaded by
+extract_fudo_sales.py --reference (fudo_*.json) into CSV.
+
+The converters run in a process pool. Each one hashes its input JSON and its
+own code (the converter's source and the shared helpers) and skips the
+conversion when both match the last run (recorded in
+fudo_reference_state.json) and its CSV is still there, so a changed converter
+reconverts its catalog on the next run; --force converts everything again.
+
+Usage:
+    python convert_reference_data.py [--workers N] [--force]
+"""
+
+import argparse
 import csv
+import hashlib
+import inspect
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import fudo_json
 
 BASE = os.path.dirname(__file__)
+STATE_FILE = os.path.join(BASE, "fudo_reference_state.json")
 
 
 def load_json(filename):
-    with open(os.path.join(BASE, filename), "r", encoding="utf-8") as f:
-        return json.load(f)
+    return fudo_json.load(os.path.join(BASE, filename))
 
 
 def build_included_map(data):
@@ -18,12 +39,13 @@ def build_included_map(data):
 
 
 def write_csv(filename, rows, fieldnames):
+    # The header is written even for an empty catalog, so readers still get its columns.
     path = os.path.join(BASE, filename)
     with open(path, "w", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
         writer.writerows(rows)
-    print(f"  {filename}: {len(rows)} rows")
+    return len(rows)
 
 
 def convert_products():
@@ -42,6 +64,7 @@ def convert_products():
             "price": a.get("price", ""),
             "cost": a.get("cost", ""),
             "active": a.get("active", ""),
+            "category_id": cat_ref["id"] if cat_ref else "",
             "category": cat_name,
             "stock": a.get("stock", ""),
             "stock_control": a.get("stockControl", ""),
@@ -54,7 +77,11 @@ def convert_products():
             "enable_online_menu": a.get("enableOnlineMenu", ""),
             "enable_qr_menu": a.get("enableQrMenu", ""),
         })
-    write_csv("fudo_products.csv", rows, list(rows[0].keys()) if rows else [])
+    return write_csv("fudo_products.csv", rows, [
+        "product_id", "name", "price", "cost", "active", "category_id", "category", "stock", "stock_control",
+        "sell_alone", "favourite", "code", "description", "preparation_time", "image_url",
+        "enable_online_menu", "enable_qr_menu",
+    ])
 
 
 def convert_categories():
@@ -67,7 +94,7 @@ def convert_categories():
             "name": a.get("name", ""),
             "active": a.get("active", ""),
         })
-    write_csv("fudo_categories.csv", rows, list(rows[0].keys()) if rows else [])
+    return write_csv("fudo_categories.csv", rows, ["category_id", "name", "active"])
 
 
 def convert_users():
@@ -89,7 +116,8 @@ def convert_users():
             "role": role_name,
             "promotional_code": a.get("promotionalCode", ""),
         })
-    write_csv("fudo_users.csv", rows, list(rows[0].keys()) if rows else [])
+    return write_csv("fudo_users.csv", rows,
+                     ["user_id", "name", "email", "active", "admin", "role", "promotional_code"])
 
 
 def convert_payment_methods():
@@ -103,7 +131,7 @@ def convert_payment_methods():
             "code": a.get("code", ""),
             "active": a.get("active", ""),
         })
-    write_csv("fudo_payment_methods.csv", rows, list(rows[0].keys()) if rows else [])
+    return write_csv("fudo_payment_methods.csv", rows, ["payment_method_id", "name", "code", "active"])
 
 
 def convert_customers():
@@ -120,7 +148,9 @@ def convert_customers():
             "sales_count": a.get("salesCount", ""),
             "historical_sales_count": a.get("historicalSalesCount", ""),
         })
-    write_csv("fudo_customers.csv", rows, list(rows[0].keys()) if rows else [])
+    return write_csv("fudo_customers.csv", rows, [
+        "customer_id", "name", "email", "phone", "address", "sales_count", "historical_sales_count",
+    ])
 
 
 def convert_expenses():
@@ -160,17 +190,93 @@ def convert_expenses():
             "payment_methods": "|".join(pay_methods),
             "payment_amounts": "|".join(pay_amounts),
         })
-    write_csv("fudo_expenses.csv", rows, list(rows[0].keys()) if rows else [])
+    return write_csv("fudo_expenses.csv", rows, [
+        "expense_id", "amount", "description", "date", "created_at", "status", "receipt_number",
+        "payment_date", "due_date", "category", "payment_methods", "payment_amounts",
+    ])
+
+
+# Input JSON -> (converter, output CSV)
+CONVERTERS = {
+    "fudo_products.json": (convert_products, "fudo_products.csv"),
+    "fudo_categories.json": (convert_categories, "fudo_categories.csv"),
+    "fudo_users.json": (convert_users, "fudo_users.csv"),
+    "fudo_payment_methods.json": (convert_payment_methods, "fudo_payment_methods.csv"),
+    "fudo_customers.json": (convert_customers, "fudo_customers.csv"),
+    "fudo_expenses.json": (convert_expenses, "fudo_expenses.csv"),
+}
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_state():
+    if not os.path.exists(STATE_FILE):
+        return {}
+    with open(STATE_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state):
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, STATE_FILE)
+
+
+def code_version(filename):
+    """Hash of the code the catalog ``filename`` is converted by."""
+    convert, _ = CONVERTERS[filename]
+    h = hashlib.sha256()
+    for func in (convert, load_json, build_included_map, write_csv):
+        h.update(inspect.getsource(func).encode("utf-8"))
+    return h.hexdigest()
+
+
+def run_converter(filename, last=None):
+    """Worker: convert one catalog unless its input hash and code version are those recorded in ``last``.
+
+    Returns (filename, {"sha256", "code"}, rows written or None if skipped, seconds).
+    """
+    start = time.perf_counter()
+    convert, csv_name = CONVERTERS[filename]
+    entry = {"sha256": file_hash(os.path.join(BASE, filename)), "code": code_version(filename)}
+    rows = None
+    # Entries of older runs were the bare input hash: they convert once more.
+    if entry != last or not os.path.exists(os.path.join(BASE, csv_name)):
+        rows = convert()
+    return filename, entry, rows, time.perf_counter() - start
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Convert the FUDO reference catalogs to CSV.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="converter processes (default: one per catalog, up to the CPU count)")
+    parser.add_argument("--force", action="store_true",
+                        help="convert every catalog even if its JSON and converter have not changed")
+    args = parser.parse_args()
+
     print("Converting reference data to CSV...")
-    convert_products()
-    convert_categories()
-    convert_users()
-    convert_payment_methods()
-    convert_customers()
-    convert_expenses()
+    start = time.perf_counter()
+    state = {} if args.force else load_state()
+    workers = args.workers or min(len(CONVERTERS), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_converter, filename, state.get(filename)) for filename in CONVERTERS]
+        results = [future.result() for future in futures]
+
+    for filename, entry, rows, seconds in results:
+        state[filename] = entry
+        csv_name = CONVERTERS[filename][1]
+        status = "unchanged, skipped" if rows is None else f"{rows} rows"
+        print(f"  {csv_name:<26} {status:<20} {seconds:7.3f}s")
+    save_state(state)
+    converted = sum(rows is not None for _, _, rows, _ in results)
+    print(f"Converted {converted}/{len(results)} catalogs in {time.perf_counter() - start:.3f}s")
     print("Done!")
 
 
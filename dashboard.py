@@ -6,6 +6,9 @@ import numpy as np
 import os
 from datetime import timedelta
 
+import sales_dims
+import sales_frame
+
 st.set_page_config(
     page_title="Mocawa Cafe - BI Dashboard",
     page_icon="☕",
@@ -34,44 +37,8 @@ COLORS = ["#ff5023", "#ff8c61", "#ffc09f", "#2ec4b6", "#3d5a80", "#ee6c4d", "#29
 
 @st.cache_data
 def load_sales():
-    df = pd.read_csv(
-        os.path.join(BASE, "fudo_sales.csv"),
-        parse_dates=["created_at", "closed_at"],
-        low_memory=False,
-    )
-    df["created_at"] = df["created_at"].dt.tz_localize(None)
-    df["closed_at"] = pd.to_datetime(df["closed_at"], errors="coerce").dt.tz_localize(None)
-
-    df["date"] = df["created_at"].dt.date
-    df["hour"] = df["created_at"].dt.hour
-    df["day_of_week"] = df["created_at"].dt.day_name()
-    df["day_num"] = df["created_at"].dt.dayofweek
-    df["year_month"] = df["created_at"].dt.to_period("M").astype(str)
-    df["year"] = df["created_at"].dt.year
-    df["month_num"] = df["created_at"].dt.month
-    df["week"] = df["created_at"].dt.to_period("W").apply(lambda r: r.start_time).dt.date
-
-    df["item_quantity"] = pd.to_numeric(df["item_quantity"], errors="coerce").fillna(0)
-    df["item_price"] = pd.to_numeric(df["item_price"], errors="coerce").fillna(0)
-    df["item_cost"] = pd.to_numeric(df["item_cost"], errors="coerce").fillna(0)
-    df["sale_total"] = pd.to_numeric(df["sale_total"], errors="coerce").fillna(0)
-    df["discount_total"] = pd.to_numeric(df["discount_total"], errors="coerce").fillna(0)
-    df["tips_total"] = pd.to_numeric(df["tips_total"], errors="coerce").fillna(0)
-
-    df["item_revenue"] = df["item_price"] * df["item_quantity"]
-    df["item_total_cost"] = df["item_cost"] * df["item_quantity"]
-    df["item_margin"] = df["item_revenue"] - df["item_total_cost"]
-
-    # Duration in minutes
-    df["duration_min"] = (df["closed_at"] - df["created_at"]).dt.total_seconds() / 60
-
-    df["product_category"] = df["product_category"].fillna("Sin Categoria")
-    df["waiter"] = df["waiter"].fillna("Sin Asignar")
-    df["sale_type"] = df["sale_type"].fillna("UNKNOWN")
-    df["sale_state"] = df["sale_state"].fillna("UNKNOWN")
-    df["product_name"] = df["product_name"].fillna("Sin Producto")
-
-    return df
+    # Typed Parquet load of the enriched frame, rebuilt from the CSV only when it changed.
+    return sales_frame.load_sales()
 
 
 @st.cache_data
@@ -82,28 +49,15 @@ def load_expenses():
     return pd.DataFrame()
 
 
-@st.cache_data
-def build_payments_df(_df_sale_ids, _df_payment_cols):
-    """Build payments dataframe from unique sales."""
-    rows = []
-    for _, row in _df_payment_cols.iterrows():
-        methods = str(row.get("payment_methods", "")).split("|")
-        amounts = str(row.get("payment_amounts", "")).split("|")
-        for m, a in zip(methods, amounts):
-            m = m.strip()
-            if not m:
-                continue
-            try:
-                a_val = float(a)
-            except (ValueError, TypeError):
-                a_val = 0
-            rows.append({"sale_id": row["sale_id"], "date": row["date"],
-                         "year_month": row["year_month"], "method": m, "amount": a_val})
-    return pd.DataFrame(rows)
+def build_payments_df(unique_sales):
+    """Build payments dataframe from unique sales (fast enough to rerun on every filter change)."""
+    payments = sales_frame.explode_payments(unique_sales)
+    method_labels = sales_dims.add_keys(payments, ["method"]) if not payments.empty else {}
+    return payments, method_labels
 
 
 # ==================== LOAD DATA ====================
-df = load_sales()
+df, labels = load_sales()
 expenses_df = load_expenses()
 
 # ==================== SIDEBAR FILTERS ====================
@@ -132,15 +86,19 @@ sale_states = st.sidebar.multiselect(
     options=sorted(df["sale_state"].unique()),
     default=["CLOSED"],
 )
+category_keys = sorted(df["category_key"].unique(), key=lambda k: labels["category"].get(k, ""))
 categories = st.sidebar.multiselect(
     "Categoria",
-    options=sorted(df["product_category"].unique()),
-    default=sorted(df["product_category"].unique()),
+    options=category_keys,
+    default=category_keys,
+    format_func=lambda k: labels["category"].get(k, "Sin Categoria"),
 )
+waiter_keys = sorted(df["waiter_key"].unique(), key=lambda k: labels["waiter"].get(k, ""))
 waiters = st.sidebar.multiselect(
     "Mesero/a",
-    options=sorted(df["waiter"].unique()),
-    default=sorted(df["waiter"].unique()),
+    options=waiter_keys,
+    default=waiter_keys,
+    format_func=lambda k: labels["waiter"].get(k, "Sin Asignar"),
 )
 
 # ==================== APPLY FILTERS ====================
@@ -149,8 +107,8 @@ mask = (
     & (df["date"] <= end_date)
     & (df["sale_type"].isin(sale_types))
     & (df["sale_state"].isin(sale_states))
-    & (df["product_category"].isin(categories))
-    & (df["waiter"].isin(waiters))
+    & (df["category_key"].isin(categories))
+    & (df["waiter_key"].isin(waiters))
 )
 fdf = df[mask].copy()
 unique_sales = fdf.drop_duplicates(subset="sale_id")
@@ -182,8 +140,8 @@ all_states_mask = (
     (df["date"] >= start_date)
     & (df["date"] <= end_date)
     & (df["sale_type"].isin(sale_types))
-    & (df["product_category"].isin(categories))
-    & (df["waiter"].isin(waiters))
+    & (df["category_key"].isin(categories))
+    & (df["waiter_key"].isin(waiters))
 )
 all_sales_in_range = df[all_states_mask].drop_duplicates(subset="sale_id")
 canceled_count = all_sales_in_range[all_sales_in_range["sale_state"] == "CANCELED"]["sale_id"].nunique()
@@ -202,7 +160,7 @@ else:
 
 # Top product
 if not fdf.empty:
-    top_product = fdf.groupby("product_name")["item_quantity"].sum().idxmax()
+    top_product = labels["product"].get(fdf.groupby("product_key")["item_quantity"].sum().idxmax(), "-")
 else:
     top_product = "-"
 
@@ -245,7 +203,7 @@ with tab_overview:
             Ingresos=("sale_total", "sum"), Ventas=("sale_id", "nunique")
         ).reset_index().rename(columns={"week": "Fecha"})
     else:
-        rev_time = unique_sales.groupby("year_month").agg(
+        rev_time = unique_sales.groupby("year_month", observed=True).agg(
             Ingresos=("sale_total", "sum"), Ventas=("sale_id", "nunique")
         ).reset_index().rename(columns={"year_month": "Fecha"})
 
@@ -288,7 +246,7 @@ with tab_overview:
 
     with col_type:
         st.subheader("Tipo de Venta en el Tiempo")
-        type_trend = unique_sales.groupby(["year_month","sale_type"])["sale_id"].nunique().reset_index()
+        type_trend = unique_sales.groupby(["year_month","sale_type"], observed=True)["sale_id"].nunique().reset_index()
         type_trend.columns = ["Mes","Tipo","Ventas"]
         fig_type = px.area(type_trend, x="Mes", y="Ventas", color="Tipo",
                            color_discrete_sequence=px.colors.qualitative.Set2)
@@ -302,12 +260,7 @@ with tab_overview:
 
     with col_dow:
         st.subheader("Ingresos por Dia de Semana")
-        day_labels = {"Monday":"Lunes","Tuesday":"Martes","Wednesday":"Miercoles",
-                      "Thursday":"Jueves","Friday":"Viernes","Saturday":"Sabado","Sunday":"Domingo"}
-        dow = unique_sales.copy()
-        dow["dia"] = dow["day_of_week"].map(day_labels)
-        dow["day_num"] = dow["day_num"]
-        dow_rev = dow.groupby(["day_num","dia"]).agg(
+        dow_rev = unique_sales.groupby(["day_num","dia"], observed=True).agg(
             ingresos=("sale_total","sum"), ventas=("sale_id","nunique")
         ).reset_index().sort_values("day_num")
         fig_dow = px.bar(dow_rev, x="dia", y="ingresos", text="ventas",
@@ -318,7 +271,7 @@ with tab_overview:
 
     with col_st:
         st.subheader("Distribucion por Tipo de Venta")
-        type_dist = unique_sales.groupby("sale_type").agg(
+        type_dist = unique_sales.groupby("sale_type", observed=True).agg(
             ventas=("sale_id","nunique"), ingresos=("sale_total","sum")
         ).reset_index()
         fig_st = px.pie(type_dist, values="ingresos", names="sale_type",
@@ -334,7 +287,7 @@ with tab_overview:
 
     with col_cum:
         st.subheader("Ingresos Acumulados")
-        cum_rev = unique_sales.groupby("year_month")["sale_total"].sum().cumsum().reset_index()
+        cum_rev = unique_sales.groupby("year_month", observed=True)["sale_total"].sum().cumsum().reset_index()
         cum_rev.columns = ["Mes", "Acumulado"]
         fig_cum = px.area(cum_rev, x="Mes", y="Acumulado", color_discrete_sequence=["#2ec4b6"])
         fig_cum.update_layout(height=380, hovermode="x unified")
@@ -342,7 +295,7 @@ with tab_overview:
 
     with col_growth:
         st.subheader("Crecimiento Mensual %")
-        monthly_rev = unique_sales.groupby("year_month")["sale_total"].sum().reset_index()
+        monthly_rev = unique_sales.groupby("year_month", observed=True)["sale_total"].sum().reset_index()
         monthly_rev.columns = ["Mes", "Ingresos"]
         monthly_rev["Crecimiento"] = monthly_rev["Ingresos"].pct_change() * 100
         monthly_rev = monthly_rev.dropna()
@@ -384,9 +337,9 @@ with tab_products:
 
     with col_pr:
         st.markdown("**Top 20 por Ingresos**")
-        top_rev = fdf.groupby("product_name").agg(
+        top_rev = sales_dims.label(fdf.groupby("product_key").agg(
             revenue=("item_revenue","sum"), qty=("item_quantity","sum")
-        ).sort_values("revenue", ascending=False).head(20).reset_index()
+        ).sort_values("revenue", ascending=False).head(20).reset_index(), labels)
         fig_tr = px.bar(top_rev, x="revenue", y="product_name", orientation="h",
                         color_discrete_sequence=["#ff5023"],
                         text=top_rev["revenue"].apply(lambda x: f"${x:,.0f}"))
@@ -396,9 +349,9 @@ with tab_products:
 
     with col_pq:
         st.markdown("**Top 20 por Cantidad**")
-        top_qty = fdf.groupby("product_name").agg(
+        top_qty = sales_dims.label(fdf.groupby("product_key").agg(
             qty=("item_quantity","sum"), revenue=("item_revenue","sum")
-        ).sort_values("qty", ascending=False).head(20).reset_index()
+        ).sort_values("qty", ascending=False).head(20).reset_index(), labels)
         fig_tq = px.bar(top_qty, x="qty", y="product_name", orientation="h",
                         color_discrete_sequence=["#2ec4b6"],
                         text=top_qty["qty"].apply(lambda x: f"{x:,.0f}"))
@@ -413,9 +366,9 @@ with tab_products:
 
     with col_cd:
         st.subheader("Ventas por Categoria")
-        cat_rev = fdf.groupby("product_category").agg(
+        cat_rev = sales_dims.label(fdf.groupby("category_key").agg(
             revenue=("item_revenue","sum"), qty=("item_quantity","sum"), cost=("item_total_cost","sum")
-        ).sort_values("revenue", ascending=False).reset_index()
+        ).sort_values("revenue", ascending=False).reset_index(), labels)
         cat_rev["margin_pct"] = ((cat_rev["revenue"] - cat_rev["cost"]) / cat_rev["revenue"] * 100).round(1)
         fig_cd = px.pie(cat_rev, values="revenue", names="product_category",
                         hole=0.4, color_discrete_sequence=px.colors.qualitative.Set2)
@@ -425,7 +378,8 @@ with tab_products:
 
     with col_ct:
         st.subheader("Tendencia por Categoria")
-        cat_trend = fdf.groupby(["year_month","product_category"])["item_revenue"].sum().reset_index()
+        cat_trend = sales_dims.label(
+            fdf.groupby(["year_month","category_key"], observed=True)["item_revenue"].sum().reset_index(), labels)
         cat_trend.columns = ["Mes","Categoria","Ingresos"]
         fig_ct = px.area(cat_trend, x="Mes", y="Ingresos", color="Categoria",
                          color_discrete_sequence=px.colors.qualitative.Set2)
@@ -436,9 +390,9 @@ with tab_products:
 
     # Product treemap
     st.subheader("Treemap de Productos")
-    tree_data = fdf.groupby(["product_category","product_name"]).agg(
+    tree_data = sales_dims.label(fdf.groupby(["category_key","product_key"]).agg(
         revenue=("item_revenue","sum")
-    ).reset_index()
+    ).reset_index(), labels)
     tree_data = tree_data[tree_data["revenue"] > 0]
     fig_tree = px.treemap(tree_data, path=["product_category","product_name"], values="revenue",
                           color="revenue", color_continuous_scale="Oranges")
@@ -449,12 +403,12 @@ with tab_products:
 
     # Full product table
     st.subheader("Tabla Completa de Productos")
-    prod_table = fdf.groupby(["product_category","product_name"]).agg(
+    prod_table = sales_dims.label(fdf.groupby(["category_key","product_key"]).agg(
         qty=("item_quantity","sum"),
         revenue=("item_revenue","sum"),
         cost=("item_total_cost","sum"),
         avg_price=("item_price","mean"),
-    ).reset_index()
+    ).reset_index(), labels)
     prod_table["margin"] = prod_table["revenue"] - prod_table["cost"]
     prod_table["margin_pct"] = (prod_table["margin"] / prod_table["revenue"] * 100).round(1)
     prod_table = prod_table.sort_values("revenue", ascending=False)
@@ -479,15 +433,17 @@ with tab_payments:
 
     st.subheader("Analisis de Metodos de Pago")
 
-    pay_cols = unique_sales[["sale_id","date","year_month","payment_methods","payment_amounts"]]
-    payments_df = build_payments_df(pay_cols["sale_id"], pay_cols)
+    payments_df, method_labels = build_payments_df(unique_sales)
+    pay_labels = {**labels, **method_labels}
 
     if not payments_df.empty:
         col_p1, col_p2 = st.columns(2)
 
         with col_p1:
             st.markdown("**Distribucion por Metodo**")
-            pay_sum = payments_df.groupby("method")["amount"].sum().sort_values(ascending=False).reset_index()
+            pay_sum = sales_dims.label(
+                payments_df.groupby("method_key")["amount"].sum().sort_values(ascending=False).reset_index(),
+                pay_labels)
             fig_p1 = px.pie(pay_sum, values="amount", names="method",
                             hole=0.4, color_discrete_sequence=px.colors.qualitative.Pastel)
             fig_p1.update_traces(textinfo="label+percent+value", texttemplate="%{label}<br>%{percent}<br>$%{value:,.0f}")
@@ -496,7 +452,9 @@ with tab_payments:
 
         with col_p2:
             st.markdown("**Conteo de Transacciones por Metodo**")
-            pay_count = payments_df.groupby("method")["sale_id"].nunique().sort_values(ascending=False).reset_index()
+            pay_count = sales_dims.label(
+                payments_df.groupby("method_key")["sale_id"].nunique().sort_values(ascending=False).reset_index(),
+                pay_labels)
             pay_count.columns = ["Metodo", "Transacciones"]
             fig_p2 = px.bar(pay_count, x="Metodo", y="Transacciones", color="Metodo",
                             color_discrete_sequence=px.colors.qualitative.Pastel)
@@ -506,7 +464,8 @@ with tab_payments:
         st.divider()
 
         st.subheader("Tendencia de Metodos de Pago")
-        pay_trend = payments_df.groupby(["year_month","method"])["amount"].sum().reset_index()
+        pay_trend = sales_dims.label(
+            payments_df.groupby(["year_month","method_key"], observed=True)["amount"].sum().reset_index(), pay_labels)
         fig_pt = px.area(pay_trend, x="year_month", y="amount", color="method",
                          color_discrete_sequence=px.colors.qualitative.Pastel)
         fig_pt.update_layout(height=400, hovermode="x unified", xaxis_title="Mes", yaxis_title="Monto ($)")
@@ -517,7 +476,7 @@ with tab_payments:
         # Payment method share over time
         st.subheader("Participacion % de Metodos en el Tiempo")
         pay_share = pay_trend.copy()
-        pay_total = pay_share.groupby("year_month")["amount"].transform("sum")
+        pay_total = pay_share.groupby("year_month", observed=True)["amount"].transform("sum")
         pay_share["pct"] = (pay_share["amount"] / pay_total * 100).round(1)
         fig_ps = px.area(pay_share, x="year_month", y="pct", color="method",
                          color_discrete_sequence=px.colors.qualitative.Pastel, groupnorm="percent")
@@ -527,7 +486,8 @@ with tab_payments:
         # Average payment per method
         st.divider()
         st.subheader("Monto Promedio por Metodo")
-        pay_avg = payments_df.groupby("method")["amount"].mean().sort_values(ascending=False).reset_index()
+        pay_avg = sales_dims.label(
+            payments_df.groupby("method_key")["amount"].mean().sort_values(ascending=False).reset_index(), pay_labels)
         pay_avg.columns = ["Metodo", "Promedio"]
         fig_pa = px.bar(pay_avg, x="Metodo", y="Promedio", color="Metodo",
                         text=pay_avg["Promedio"].apply(lambda x: f"${x:,.0f}"),
@@ -544,16 +504,18 @@ with tab_staff:
 
     st.subheader("Rendimiento por Mesero/a")
 
-    waiter_stats = unique_sales.groupby("waiter").agg(
+    waiter_stats = unique_sales.groupby("waiter_key").agg(
         ventas=("sale_id","nunique"),
         ingresos=("sale_total","sum"),
         ticket_prom=("sale_total","mean"),
     ).reset_index().sort_values("ingresos", ascending=False)
 
     # Items per waiter
-    waiter_items = fdf.groupby("waiter")["item_quantity"].sum().reset_index()
-    waiter_items.columns = ["waiter","items"]
-    waiter_stats = waiter_stats.merge(waiter_items, on="waiter", how="left")
+    waiter_items = fdf.groupby("waiter_key")["item_quantity"].sum().reset_index()
+    waiter_items.columns = ["waiter_key","items"]
+    waiter_stats = waiter_stats.merge(waiter_items, on="waiter_key", how="left")
+    top_waiter_keys = waiter_stats.head(8)["waiter_key"].tolist()
+    waiter_stats = sales_dims.label(waiter_stats, labels)
 
     col_w1, col_w2 = st.columns(2)
 
@@ -596,10 +558,9 @@ with tab_staff:
 
     # Waiter activity over time
     st.subheader("Actividad de Staff en el Tiempo")
-    waiter_time = unique_sales.groupby(["year_month","waiter"])["sale_id"].nunique().reset_index()
-    waiter_time.columns = ["Mes","Mesero","Ventas"]
-    top_waiters = waiter_stats.head(8)["waiter"].tolist()
-    waiter_time_top = waiter_time[waiter_time["Mesero"].isin(top_waiters)]
+    waiter_time = unique_sales.groupby(["year_month","waiter_key"], observed=True)["sale_id"].nunique().reset_index()
+    waiter_time_top = sales_dims.label(waiter_time[waiter_time["waiter_key"].isin(top_waiter_keys)], labels)
+    waiter_time_top.columns = ["Mes","Mesero","Ventas"]
     fig_wt = px.line(waiter_time_top, x="Mes", y="Ventas", color="Mesero",
                      markers=True, color_discrete_sequence=COLORS)
     fig_wt.update_layout(height=400, hovermode="x unified")
@@ -610,15 +571,11 @@ with tab_staff:
 with tab_time:
 
     st.subheader("Patrones de Horario")
-    day_labels = {"Monday":"Lunes","Tuesday":"Martes","Wednesday":"Miercoles",
-                  "Thursday":"Jueves","Friday":"Viernes","Saturday":"Sabado","Sunday":"Domingo"}
-
     # Heatmap
     st.markdown("**Mapa de Calor: Ingresos por Dia y Hora**")
-    hm_data = fdf.copy()
-    hm_data["day_label"] = hm_data["day_of_week"].map(day_labels)
-    hm = hm_data.groupby(["day_num","day_label","hour"])["item_revenue"].sum().reset_index()
-    hm_pivot = hm.pivot_table(index=["day_num","day_label"], columns="hour", values="item_revenue", fill_value=0)
+    hm_data = fdf
+    hm = hm_data.groupby(["day_num","dia","hour"], observed=True)["item_revenue"].sum().reset_index()
+    hm_pivot = hm.pivot_table(index=["day_num","dia"], columns="hour", values="item_revenue", fill_value=0, observed=True)
     hm_pivot = hm_pivot.sort_index(level=0)
 
     fig_hm = go.Figure(data=go.Heatmap(
@@ -648,9 +605,7 @@ with tab_time:
 
     with col_h2:
         st.markdown("**Ventas por Dia de Semana**")
-        dow2 = unique_sales.copy()
-        dow2["dia"] = dow2["day_of_week"].map(day_labels)
-        dow2_agg = dow2.groupby(["day_num","dia"]).agg(
+        dow2_agg = unique_sales.groupby(["day_num","dia"], observed=True).agg(
             ventas=("sale_id","nunique"), ingresos=("sale_total","sum")
         ).reset_index().sort_values("day_num")
         dow2_agg["ticket"] = dow2_agg["ingresos"] / dow2_agg["ventas"]
@@ -664,8 +619,8 @@ with tab_time:
 
     # Heatmap: count of sales
     st.markdown("**Mapa de Calor: Cantidad de Ventas por Dia y Hora**")
-    hm2 = hm_data.drop_duplicates(subset="sale_id").groupby(["day_num","day_label","hour"])["sale_id"].nunique().reset_index()
-    hm2_pivot = hm2.pivot_table(index=["day_num","day_label"], columns="hour", values="sale_id", fill_value=0)
+    hm2 = hm_data.drop_duplicates(subset="sale_id").groupby(["day_num","dia","hour"], observed=True)["sale_id"].nunique().reset_index()
+    hm2_pivot = hm2.pivot_table(index=["day_num","dia"], columns="hour", values="sale_id", fill_value=0, observed=True)
     hm2_pivot = hm2_pivot.sort_index(level=0)
     fig_hm2 = go.Figure(data=go.Heatmap(
         z=hm2_pivot.values,
@@ -687,9 +642,9 @@ with tab_profit:
 
     with col_m1:
         st.markdown("**Margen Bruto % por Categoria**")
-        cat_m = fdf.groupby("product_category").agg(
+        cat_m = sales_dims.label(fdf.groupby("category_key").agg(
             revenue=("item_revenue","sum"), cost=("item_total_cost","sum")
-        ).reset_index()
+        ).reset_index(), labels)
         cat_m["margin_pct"] = ((cat_m["revenue"] - cat_m["cost"]) / cat_m["revenue"] * 100).round(1)
         cat_m["margin_abs"] = cat_m["revenue"] - cat_m["cost"]
         cat_m = cat_m.sort_values("margin_pct", ascending=True)
@@ -714,7 +669,7 @@ with tab_profit:
 
     # Margin over time
     st.subheader("Margen Bruto % en el Tiempo")
-    margin_time = fdf.groupby("year_month").agg(
+    margin_time = fdf.groupby("year_month", observed=True).agg(
         revenue=("item_revenue","sum"), cost=("item_total_cost","sum")
     ).reset_index()
     margin_time["margin_pct"] = ((margin_time["revenue"] - margin_time["cost"]) / margin_time["revenue"] * 100).round(1)
@@ -737,9 +692,9 @@ with tab_profit:
     # Top/bottom margin products
     col_tp, col_bp = st.columns(2)
 
-    prod_m = fdf[fdf["item_cost"] > 0].groupby("product_name").agg(
+    prod_m = sales_dims.label(fdf[fdf["item_cost"] > 0].groupby("product_key").agg(
         revenue=("item_revenue","sum"), cost=("item_total_cost","sum"), qty=("item_quantity","sum")
-    ).reset_index()
+    ).reset_index(), labels)
     prod_m["margin"] = prod_m["revenue"] - prod_m["cost"]
     prod_m["margin_pct"] = (prod_m["margin"] / prod_m["revenue"] * 100).round(1)
 
@@ -806,9 +761,9 @@ with tab_detail:
         st.write(f"- Duracion prom: **{avg_duration:.0f} min**")
     with col_d3:
         st.markdown("**Productos**")
-        n_products = fdf["product_name"].nunique()
-        n_categories = fdf["product_category"].nunique()
-        n_waiters = fdf["waiter"].nunique()
+        n_products = fdf["product_key"].nunique()
+        n_categories = fdf["category_key"].nunique()
+        n_waiters = fdf["waiter_key"].nunique()
         st.write(f"- Productos vendidos: **{n_products}**")
         st.write(f"- Categorias: **{n_categories}**")
         st.write(f"- Meseros activos: **{n_waiters}**")
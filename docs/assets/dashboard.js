@@ -87,10 +87,32 @@ const plotlyConfig = {
 
 // ─── Helpers ──────────────────────────────────────────────
 const cache = {};
+
+// Tables arrive column-oriented ({cols, data: {col: [...]}}); turn them back into row objects.
+function decodeTables(obj) {
+    if (Array.isArray(obj)) return obj.map(decodeTables);
+    if (obj === null || typeof obj !== "object") return obj;
+    if (Array.isArray(obj.cols) && obj.data && typeof obj.data === "object") {
+        const cols = obj.cols;
+        const arrays = cols.map(c => obj.data[c]);
+        const n = arrays.length ? arrays[0].length : 0;
+        const rows = new Array(n);
+        for (let i = 0; i < n; i++) {
+            const row = {};
+            for (let j = 0; j < cols.length; j++) row[cols[j]] = arrays[j][i];
+            rows[i] = row;
+        }
+        return rows;
+    }
+    const out = {};
+    Object.keys(obj).forEach(key => { out[key] = decodeTables(obj[key]); });
+    return out;
+}
+
 async function fetchJSON(name) {
     if (cache[name]) return cache[name];
     const resp = await fetch(`data/${name}`);
-    const data = await resp.json();
+    const data = decodeTables(await resp.json());
     cache[name] = data;
     return data;
 }
@@ -109,16 +131,22 @@ function fmtPct(v) {
     return v.toFixed(1) + "%";
 }
 
+// Layout = plotlyLayout + overrides. One-level copies (Plotly writes ranges back into the axis
+// objects, so charts must not share them); no deep clone of the whole template per chart.
 function L(overrides) {
-    const base = JSON.parse(JSON.stringify(plotlyLayout));
+    const base = {};
+    for (const key in plotlyLayout) {
+        const v = plotlyLayout[key];
+        base[key] = (v && typeof v === "object") ? { ...v } : v;
+    }
     if (overrides) {
-        Object.keys(overrides).forEach(key => {
+        for (const key in overrides) {
             if (key === 'xaxis' || key === 'yaxis' || key === 'yaxis2') {
-                base[key] = { ...base[key === 'yaxis2' ? 'yaxis' : key], ...overrides[key] };
+                base[key] = { ...plotlyLayout[key === 'yaxis2' ? 'yaxis' : key], ...overrides[key] };
             } else {
                 base[key] = overrides[key];
             }
-        });
+        }
     }
     return base;
 }
@@ -199,6 +227,7 @@ function loadTab(tab) {
         time: renderTime,
         profit: renderProfit,
         detail: renderDetail,
+        explore: renderExplorer,
     };
     if (renderers[tab]) renderers[tab]();
 }
@@ -259,18 +288,12 @@ function renderRevenueChart(gran) {
 }
 
 function renderYoY(d) {
-    const traces = [];
-    d.yoy.years.forEach((yr, i) => {
-        const yrData = d.yoy.data.filter(r => r.year === yr);
-        traces.push({
-            x: yrData.map(r => r.month),
-            y: yrData.map(r => r.ingresos),
-            name: yr,
-            mode: "lines+markers",
-            line: { color: CHART_COLORS[i % CHART_COLORS.length], width: 3, shape: "spline" },
-            marker: { color: CHART_COLORS[i % CHART_COLORS.length], size: 8 },
-        });
-    });
+    const traces = d.yoy.map((s, i) => ({
+        x: s.x, y: s.y, name: s.name,
+        mode: "lines+markers",
+        line: { color: CHART_COLORS[i % CHART_COLORS.length], width: 3, shape: "spline" },
+        marker: { color: CHART_COLORS[i % CHART_COLORS.length], size: 8 },
+    }));
     const tickVals = [1,2,3,4,5,6,7,8,9,10,11,12];
     const tickText = Object.values(d.month_names);
     Plotly.react("chart-yoy", traces, L({
@@ -282,16 +305,11 @@ function renderYoY(d) {
 }
 
 function renderTypeTrend(d) {
-    const types = [...new Set(d.type_trend.map(r => r.tipo))];
-    const traces = types.map((t, i) => {
-        const rows = d.type_trend.filter(r => r.tipo === t);
-        return {
-            x: rows.map(r => r.mes), y: rows.map(r => r.ventas),
-            name: t, stackgroup: "one",
-            fillcolor: CHART_COLORS[i % CHART_COLORS.length] + "60",
-            line: { color: CHART_COLORS[i % CHART_COLORS.length], width: 0 },
-        };
-    });
+    const traces = d.type_trend.map((s, i) => ({
+        x: s.x, y: s.y, name: s.name, stackgroup: "one",
+        fillcolor: CHART_COLORS[i % CHART_COLORS.length] + "60",
+        line: { color: CHART_COLORS[i % CHART_COLORS.length], width: 0 },
+    }));
     Plotly.react("chart-type-trend", traces, L({
         height: 400,
         hovermode: "x unified",
@@ -505,42 +523,23 @@ async function renderProducts() {
     }), plotlyConfig);
 
     // Category trend
-    const cats = [...new Set(d.category_trend.map(r => r.categoria))];
-    const catTraces = cats.map((c, i) => {
-        const rows = d.category_trend.filter(r => r.categoria === c);
-        return {
-            x: rows.map(r => r.mes), y: rows.map(r => r.ingresos),
-            name: c, stackgroup: "one",
-            fillcolor: CHART_COLORS[i % CHART_COLORS.length] + "70",
-            line: { color: CHART_COLORS[i % CHART_COLORS.length], width: 0 },
-        };
-    });
+    const catTraces = d.category_trend.map((s, i) => ({
+        x: s.x, y: s.y, name: s.name, stackgroup: "one",
+        fillcolor: CHART_COLORS[i % CHART_COLORS.length] + "70",
+        line: { color: CHART_COLORS[i % CHART_COLORS.length], width: 0 },
+    }));
     Plotly.react("chart-cat-trend", catTraces, L({
         height: 400,
         hovermode: "x unified",
         legend: { orientation: "h", y: 1.15 },
     }), plotlyConfig);
 
-    // Treemap
-    const labels = [], parents = [], values = [], colors = [];
-    const catSet = [...new Set(d.treemap.map(r => r.product_category))];
-    catSet.forEach((cat, i) => {
-        labels.push(cat);
-        parents.push("");
-        const catTotal = d.treemap.filter(r => r.product_category === cat).reduce((s, r) => s + r.revenue, 0);
-        values.push(catTotal);
-        colors.push(CHART_COLORS[i % CHART_COLORS.length]);
-    });
-    d.treemap.forEach(r => {
-        labels.push(r.product_name);
-        parents.push(r.product_category);
-        values.push(r.revenue);
-        const catIdx = catSet.indexOf(r.product_category);
-        colors.push(CHART_COLORS[catIdx % CHART_COLORS.length] + "90");
-    });
+    // Treemap (categories, then their products; products get a translucent category color)
+    const tm = d.treemap;
+    const colors = tm.color_index.map((c, i) => CHART_COLORS[c % CHART_COLORS.length] + (tm.parents[i] ? "90" : ""));
 
     Plotly.react("chart-treemap", [{
-        type: "treemap", labels, parents, values,
+        type: "treemap", labels: tm.labels, parents: tm.parents, values: tm.values,
         marker: {
             colors: colors,
             line: { color: "#0f172a", width: 2 }
@@ -620,16 +619,11 @@ async function renderPayments() {
     }), plotlyConfig);
 
     // Payment trend
-    const methods = [...new Set(d.trend.map(r => r.method))];
-    const trendTraces = methods.map((m, i) => {
-        const rows = d.trend.filter(r => r.method === m);
-        return {
-            x: rows.map(r => r.year_month), y: rows.map(r => r.amount),
-            name: m, stackgroup: "one",
-            fillcolor: PAY_COLORS[i % PAY_COLORS.length] + "80",
-            line: { color: PAY_COLORS[i % PAY_COLORS.length], width: 0 },
-        };
-    });
+    const trendTraces = d.trend.map((s, i) => ({
+        x: s.x, y: s.y, name: s.name, stackgroup: "one",
+        fillcolor: PAY_COLORS[i % PAY_COLORS.length] + "80",
+        line: { color: PAY_COLORS[i % PAY_COLORS.length], width: 0 },
+    }));
     Plotly.react("chart-pay-trend", trendTraces, L({
         height: 400,
         hovermode: "x unified",
@@ -639,15 +633,11 @@ async function renderPayments() {
     }), plotlyConfig);
 
     // Payment share %
-    const shareTraces = methods.map((m, i) => {
-        const rows = d.share.filter(r => r.method === m);
-        return {
-            x: rows.map(r => r.year_month), y: rows.map(r => r.pct),
-            name: m, stackgroup: "one", groupnorm: "percent",
-            fillcolor: PAY_COLORS[i % PAY_COLORS.length] + "90",
-            line: { color: PAY_COLORS[i % PAY_COLORS.length], width: 0 },
-        };
-    });
+    const shareTraces = d.share.map((s, i) => ({
+        x: s.x, y: s.y, name: s.name, stackgroup: "one", groupnorm: "percent",
+        fillcolor: PAY_COLORS[i % PAY_COLORS.length] + "90",
+        line: { color: PAY_COLORS[i % PAY_COLORS.length], width: 0 },
+    }));
     Plotly.react("chart-pay-share", shareTraces, L({
         height: 400,
         hovermode: "x unified",
@@ -741,16 +731,12 @@ async function renderStaff() {
     document.getElementById("waiter-table").innerHTML = buildTable(headers, rows, aligns);
 
     // Staff activity over time
-    const traces = d.top_waiters.map((w, i) => {
-        const rows2 = d.waiter_time.filter(r => r.mesero === w);
-        return {
-            x: rows2.map(r => r.mes), y: rows2.map(r => r.ventas),
-            name: w,
-            mode: "lines+markers",
-            line: { color: CHART_COLORS[i % CHART_COLORS.length], width: 3, shape: "spline" },
-            marker: { color: CHART_COLORS[i % CHART_COLORS.length], size: 6 },
-        };
-    });
+    const traces = d.waiter_time.map((s, i) => ({
+        x: s.x, y: s.y, name: s.name,
+        mode: "lines+markers",
+        line: { color: CHART_COLORS[i % CHART_COLORS.length], width: 3, shape: "spline" },
+        marker: { color: CHART_COLORS[i % CHART_COLORS.length], size: 6 },
+    }));
     Plotly.react("chart-waiter-time", traces, L({
         height: 400,
         hovermode: "x unified",
@@ -773,8 +759,7 @@ async function renderStaff() {
 }
 
 function renderWaiterMonthly(d, month) {
-    const rows = d.waiter_monthly.filter(r => r.year_month === month)
-        .sort((a, b) => b.ingresos - a.ingresos);
+    const rows = d.waiter_monthly[month] || [];  // sorted by revenue at build time
 
     if (!rows.length) {
         document.getElementById("waiter-monthly-table").innerHTML =
@@ -1141,6 +1126,249 @@ async function renderDetail() {
 }
 
 
+// ═══════════════════════════════════════════════════════════
+//  TAB: EXPLORAR (client-side filters over cube.bin)
+// ═══════════════════════════════════════════════════════════
+const TYPED_ARRAYS = {
+    uint8: Uint8Array, uint16: Uint16Array, uint32: Uint32Array,
+    int8: Int8Array, int16: Int16Array, int32: Int32Array, float32: Float32Array,
+};
+const DAY_MS = 86400000;
+let explorer = null;
+
+// cube.bin is fetched through its .gz sibling when the browser can inflate it: static hosts such as
+// GitHub Pages don't compress .bin files on the wire.
+async function fetchBinary(name) {
+    if (typeof DecompressionStream !== "undefined") {
+        const resp = await fetch(`data/${name}.gz`);
+        if (resp.ok) {
+            const bytes = new Uint8Array(await resp.arrayBuffer());
+            if (bytes[0] !== 0x1f || bytes[1] !== 0x8b) return bytes.buffer;  // inflated by the server already
+            const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("gzip"));
+            return new Response(stream).arrayBuffer();
+        }
+    }
+    const resp = await fetch(`data/${name}`);
+    return resp.arrayBuffer();
+}
+
+// Typed-array views on the blob, one per column (the build writes little-endian, 4-byte aligned columns).
+function openCube(header, buffer) {
+    const tables = {};
+    Object.entries(header.tables).forEach(([name, t]) => {
+        const cols = {}, scale = {};
+        Object.entries(t.columns).forEach(([col, c]) => {
+            cols[col] = new TYPED_ARRAYS[c.type](buffer, c.offset, t.rows);
+            scale[col] = c.scale;
+        });
+        tables[name] = { rows: t.rows, cols, scale };
+    });
+    const start = Date.parse(header.start);
+    const dates = Array.from({ length: header.days }, (_, i) => new Date(start + i * DAY_MS).toISOString().slice(0, 10));
+    return { ...header, tables, dates };
+}
+
+function selectionMask(selectId, size) {
+    const selected = Array.from(document.getElementById(selectId).selectedOptions, o => +o.value);
+    const mask = new Uint8Array(size).fill(selected.length ? 0 : 1);
+    selected.forEach(i => { mask[i] = 1; });
+    return { mask, all: !selected.length };
+}
+
+function readFilters(cube) {
+    const dims = cube.dimensions;
+    const dayOf = id => {
+        const v = document.getElementById(id).value;
+        return v ? Math.round((Date.parse(v) - Date.parse(cube.start)) / DAY_MS) : null;
+    };
+    const d0 = dayOf("f-start"), d1 = dayOf("f-end");
+    const categories = selectionMask("f-category", dims.category.length);
+    return {
+        d0: Math.max(d0 == null ? 0 : d0, 0),
+        d1: Math.min(d1 == null ? cube.days - 1 : d1, cube.days - 1),
+        types: selectionMask("f-type", dims.sale_type.length).mask,
+        waiters: selectionMask("f-waiter", dims.waiter.length).mask,
+        categories: categories.mask,
+        allCategories: categories.all,
+    };
+}
+
+// One pass over the item cells and one over the sale cells that match the filters. The sale cells give the
+// day x hour heatmap (they have no category) and, without a category filter, the exact sales counts.
+function aggregateCube(cube, f) {
+    const dims = cube.dimensions;
+    const nt = dims.sale_type.length;
+    const byDay = new Float64Array(cube.days), salesByDay = new Float64Array(cube.days);
+    const byHeat = new Float64Array(7 * 24), byCategory = new Float64Array(dims.category.length);
+    const byWaiter = new Float64Array(dims.waiter.length), salesByType = new Float64Array(nt);
+    let revenue = 0, cost = 0, quantity = 0;
+
+    const it = cube.tables.items, c = it.cols;
+    const { day, sale_type, waiter, category } = c;
+    for (let i = 0; i < it.rows; i++) {
+        const d = day[i];
+        if (d < f.d0 || d > f.d1 || !f.types[sale_type[i]] || !f.waiters[waiter[i]] || !f.categories[category[i]]) continue;
+        const r = c.revenue[i];
+        revenue += r;
+        cost += c.cost[i];
+        quantity += c.quantity[i];
+        byDay[d] += r;
+        byCategory[category[i]] += r;
+        byWaiter[waiter[i]] += r;
+        if (!f.allCategories) {
+            salesByDay[d] += c.category_sales[i];
+            salesByType[sale_type[i]] += c.category_sales[i];
+        }
+    }
+    const st = cube.tables.sales, s = st.cols;
+    for (let i = 0; i < st.rows; i++) {
+        const d = s.day[i];
+        if (d < f.d0 || d > f.d1 || !f.types[s.sale_type[i]] || !f.waiters[s.waiter[i]]) continue;
+        byHeat[((cube.start_weekday + d) % 7) * 24 + s.hour[i]] += s.sales[i];
+        if (f.allCategories) {
+            salesByDay[d] += s.sales[i];
+            salesByType[s.sale_type[i]] += s.sales[i];
+        }
+    }
+    const salesScale = f.allCategories ? st.scale.sales : it.scale.category_sales;
+
+    // Columns are stored divided by a per-column scale: apply it once to the sums.
+    const rs = it.scale.revenue;
+    [byDay, byCategory, byWaiter].forEach(a => { for (let i = 0; i < a.length; i++) a[i] *= rs; });
+    [salesByDay, salesByType].forEach(a => { for (let i = 0; i < a.length; i++) a[i] *= salesScale; });
+    for (let i = 0; i < byHeat.length; i++) byHeat[i] *= st.scale.sales;
+    let sales = 0;
+    for (let i = 0; i < salesByType.length; i++) sales += salesByType[i];
+    return {
+        revenue: revenue * rs, cost: cost * it.scale.cost, quantity: quantity * it.scale.quantity, sales,
+        byDay, salesByDay, byHeat, byCategory, byWaiter, salesByType,
+    };
+}
+
+async function renderExplorer() {
+    try {
+        const [header, buffer] = await Promise.all([fetchJSON("cube.json"), fetchBinary("cube.bin")]);
+        explorer = openCube(header, buffer);
+    } catch (e) {
+        // Output sets built before the cube target existed
+        document.getElementById("tab-explore").innerHTML = "<p>No hay datos para explorar (falta cube.bin).</p>";
+        return;
+    }
+    const cube = explorer, dims = cube.dimensions;
+
+    const fill = (id, names) => {
+        document.getElementById(id).innerHTML = names.map((n, i) => `<option value="${i}">${n}</option>`).join("");
+    };
+    fill("f-type", dims.sale_type);
+    fill("f-category", dims.category);
+    fill("f-waiter", dims.waiter);
+    ["f-start", "f-end"].forEach(id => {
+        const input = document.getElementById(id);
+        input.min = cube.dates[0];
+        input.max = cube.dates[cube.dates.length - 1];
+    });
+    document.getElementById("f-start").value = cube.dates[0];
+    document.getElementById("f-end").value = cube.dates[cube.dates.length - 1];
+
+    // Re-aggregate at most once per frame while a filter is being changed.
+    let pending = false;
+    const update = () => {
+        if (pending) return;
+        pending = true;
+        requestAnimationFrame(() => { pending = false; updateExplorer(); });
+    };
+    ["f-start", "f-end", "f-type", "f-category", "f-waiter"].forEach(id =>
+        document.getElementById(id).addEventListener("change", update));
+    document.getElementById("f-reset").addEventListener("click", () => {
+        ["f-type", "f-category", "f-waiter"].forEach(id => {
+            Array.from(document.getElementById(id).options).forEach(o => { o.selected = false; });
+        });
+        document.getElementById("f-start").value = cube.dates[0];
+        document.getElementById("f-end").value = cube.dates[cube.dates.length - 1];
+        update();
+    });
+    updateExplorer();
+}
+
+function updateExplorer() {
+    const cube = explorer, dims = cube.dimensions;
+    const f = readFilters(cube);
+    const a = aggregateCube(cube, f);
+    const days = Math.max(f.d1 - f.d0 + 1, 1);
+
+    const setKPI = (id, val) => { document.querySelector(`#${id} .kpi-value`).textContent = val; };
+    setKPI("xkpi-revenue", fmt$(a.revenue));
+    setKPI("xkpi-sales", fmtN(a.sales));
+    setKPI("xkpi-ticket", fmt$(a.sales > 0 ? a.revenue / a.sales : 0));
+    setKPI("xkpi-items", fmtN(a.quantity));
+    setKPI("xkpi-margin", fmtPct(a.revenue > 0 ? (a.revenue - a.cost) / a.revenue * 100 : 0));
+    setKPI("xkpi-daily", fmt$(a.revenue / days));
+
+    // Daily revenue + sales
+    const dates = cube.dates.slice(f.d0, f.d1 + 1);
+    Plotly.react("chart-explore-daily", [
+        {
+            x: dates, y: Array.from(a.byDay.subarray(f.d0, f.d1 + 1)), name: "Ingresos",
+            type: "scatter", fill: "tozeroy",
+            fillcolor: "rgba(255, 107, 61, 0.15)",
+            line: { color: PALETTE.primary, width: 2 },
+        },
+        {
+            x: dates, y: Array.from(a.salesByDay.subarray(f.d0, f.d1 + 1)), name: "# Ventas",
+            type: "bar",
+            marker: { color: "rgba(0, 212, 170, 0.4)" },
+            yaxis: "y2",
+        },
+    ], L({
+        yaxis: { title: "Ingresos ($)" },
+        yaxis2: { title: "# Ventas", overlaying: "y", side: "right" },
+        hovermode: "x unified",
+        height: 400,
+        legend: { orientation: "h", y: 1.12, x: 0.5, xanchor: "center" },
+    }), plotlyConfig);
+
+    // Day x hour heatmap of sales (not filtered by category)
+    const z = cube.dia.map((_, d) => Array.from(a.byHeat.subarray(d * 24, d * 24 + 24)));
+    Plotly.react("chart-explore-heatmap", [{
+        z, x: Array.from({ length: 24 }, (_, h) => h + ":00"), y: cube.dia,
+        type: "heatmap",
+        colorscale: HEATMAP_WARM,
+        hovertemplate: "<b>%{y}</b><br>Hora: %{x}<br>Ventas: %{z:,.0f}<extra></extra>",
+        colorbar: { tickfont: { color: "#94a3b8" }, outlinecolor: "#475569" },
+    }], L({ height: 380, yaxis: { autorange: "reversed" } }), plotlyConfig);
+
+    // Sales per type
+    Plotly.react("chart-explore-type", [{
+        values: Array.from(a.salesByType), labels: dims.sale_type,
+        type: "pie", hole: 0.5,
+        marker: { colors: CHART_COLORS, line: { color: "#0f172a", width: 2 } },
+        textinfo: "label+percent",
+        textfont: { color: "#fff" },
+    }], L({ height: 380, showlegend: false }), plotlyConfig);
+
+    // Revenue per category / waiter, largest first
+    const ranked = (values, names) => {
+        const order = Array.from(values.keys()).filter(i => values[i] > 0).sort((i, j) => values[j] - values[i]);
+        return { y: order.map(i => names[i]), x: order.map(i => values[i]) };
+    };
+    [["chart-explore-category", ranked(a.byCategory, dims.category), PALETTE.primary],
+     ["chart-explore-waiter", ranked(a.byWaiter, dims.waiter), PALETTE.secondary]].forEach(([id, r, color]) => {
+        Plotly.react(id, [{
+            y: r.y, x: r.x,
+            type: "bar", orientation: "h",
+            marker: { color: color + "cc", line: { color, width: 1 } },
+            text: r.x.map(fmt$),
+            textposition: "outside",
+            textfont: { color: "#94a3b8" },
+        }], L({
+            height: Math.max(300, r.y.length * 32 + 80),
+            yaxis: { autorange: "reversed" },
+            margin: { l: 160 },
+        }), plotlyConfig);
+    });
+}
+
+
 // ═══════════════════════════════════════════════════════════
 //  INIT
 // ═══════════════════════════════════════════════════════════
@@ -1,30 +1,84 @@
-import requests
+import argparse
+import hashlib
 import json
 import csv
-import time
+import heapq
 import sys
 import os
+import time
+import math
+import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import groupby, islice
+from operator import itemgetter
+from urllib.parse import quote
+
+import fudo_json
+from extract_telemetry import ExtractTelemetry, METRICS_FILE, REPORT_JSON, print_summary
+from fudo_client import FudoAPIError, FudoClient
 
-API_BASE = "https://api.fu.do/v1alpha1"
-AUTH_URL = "https://auth.fu.do/api"
+try:
+    import sales_star
+except ImportError:  # pyarrow not installed: CSV + raw archive only
+    sales_star = None
+
+# Overridable to point the extractor at mock_fudo_api.py
+API_BASE = os.environ.get("FUDO_API_BASE", "https://api.fu.do/v1alpha1")
+AUTH_URL = os.environ.get("FUDO_AUTH_URL", "https://auth.fu.do/api")
 API_KEY = "MTBAOTE1NzA="
 API_SECRET = "HMpoQYdTKD1bYWvi7c2khNWdvJBEIKWR"
 
 PAGE_SIZE = 500
 INCLUDES = "items,items.product,items.product.productCategory,payments.paymentMethod,discounts,tips,waiter,customer,items.subitems,items.subitems.product"
 
+# --slim: reference entities come from the catalogs, so sales pages only embed their own
+# line items, payments, discounts and tips, trimmed to the fields parse_sales_page reads.
+SLIM_INCLUDES = "items,items.subitems,payments,discounts,tips"
+SLIM_FIELDS = {
+    "Sale": "createdAt,closedAt,updatedAt,total,saleType,saleState,people,comment,customerName,"
+            "anonymousCustomer,items,payments,discounts,tips,waiter,customer",
+    "Item": "quantity,price,comment,canceled,product,subitems",
+    "Subitem": "quantity,price,product",
+    "Payment": "amount,paymentMethod",
+    "Discount": "amount",
+    "Tip": "amount",
+}
+SLIM_CATALOGS = ["fudo_products.json", "fudo_categories.json", "fudo_users.json",
+                 "fudo_payment_methods.json", "fudo_customers.json"]
+
+RATE_LIMIT = 4.0  # requests/second, adapts down on 429s
+
+# Reference catalogs consumed by convert_reference_data.py: output file -> (endpoint, include)
+REFERENCE_ENDPOINTS = {
+    "fudo_products.json": ("/products", "productCategory"),
+    "fudo_categories.json": ("/product-categories", None),
+    "fudo_users.json": ("/users", "role"),
+    "fudo_payment_methods.json": ("/payment-methods", None),
+    "fudo_customers.json": ("/customers", None),
+    "fudo_expenses.json": ("/expenses", "expenseCategory,payments.paymentMethod"),
+}
+
 OUTPUT_CSV = os.path.join(os.path.dirname(__file__), "fudo_sales.csv")
-OUTPUT_JSON = os.path.join(os.path.dirname(__file__), "fudo_sales_raw.json")
+OUTPUT_JSON = os.path.join(os.path.dirname(__file__), "fudo_sales_raw.jsonl")
+OUTPUT_ENTITIES = os.path.join(os.path.dirname(__file__), "fudo_sales_entities.jsonl")
+REPLAY_BATCH = 8  # archive pages per --replay worker task
+
+STATE_FILE = os.path.join(os.path.dirname(__file__), "fudo_sales_state.json")
+CHECKPOINT_FILE = os.path.join(os.path.dirname(__file__), "fudo_sales_checkpoint.json")
 
+SALES_FIELDS = [
+    "sale_id", "created_at", "closed_at", "sale_total", "sale_type", "sale_state", "people", "comment",
+    "customer_name", "customer_phone", "customer_email", "waiter_id", "waiter", "discount_total", "tips_total",
+    "payment_method_ids", "payment_methods", "payment_amounts", "product_id", "product_name", "category_id",
+    "product_category", "item_quantity", "item_price", "item_cost", "item_comment", "item_canceled", "subitems",
+]
 
-def authenticate():
-    print("Authenticating...")
-    r = requests.post(AUTH_URL, json={"apiKey": API_KEY, "apiSecret": API_SECRET},
-                      headers={"Content-Type": "application/json", "Accept": "application/json"})
-    r.raise_for_status()
-    data = r.json()
-    print(f"Token obtained, expires at {data.get('exp')}")
-    return data["token"]
+
+def make_client(workers=1):
+    return FudoClient(API_KEY, API_SECRET, API_BASE, AUTH_URL,
+                      rate=RATE_LIMIT, pool_size=max(4, workers * 2))
 
 
 def build_included_map(included_list):
@@ -43,102 +97,394 @@ def get_related(included_map, rel_data):
     return included_map.get((rel_data["type"], str(rel_data["id"])))
 
 
-def fetch_all_sales(token):
-    headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
-    all_rows = []
-    all_raw = []
-    page = 1
-    total_sales = 0
+class EntityRegistry:
+    """Run-wide cache of the reference entities sales point at (products, categories,
+    payment methods, waiters, customers).
 
-    while True:
-        url = f"{API_BASE}/sales?page%5Bsize%5D={PAGE_SIZE}&page%5Bnumber%5D={page}&sort=createdAt&include={INCLUDES}"
-        try:
-            r = requests.get(url, headers=headers, timeout=60)
-        except requests.exceptions.Timeout:
-            print(f"  Timeout on page {page}, retrying in 5s...")
-            time.sleep(5)
-            continue
-
-        if r.status_code == 401:
-            print("  Token expired, re-authenticating...")
-            token = authenticate()
-            headers["Authorization"] = f"Bearer {token}"
-            continue
-
-        if r.status_code != 200:
-            print(f"  Error {r.status_code} on page {page}: {r.text[:200]}")
-            time.sleep(2)
-            continue
-
-        data = r.json()
-        sales = data.get("data", [])
-        included = data.get("included", [])
+    Each entity is interned the first time a page includes it and its resolved value
+    (a name, or a product's name/cost/category) is computed once; every later item,
+    payment or sale resolves it with a single dict lookup. Interned entities are
+    archived once in OUTPUT_ENTITIES and stripped from the raw pages.
 
-        if not sales:
-            break
+    Catalogs added with add_catalog() back pages that only carry relationship ids
+    (--slim); their records are interned, and archived, only once a sale uses them.
+    """
+
+    def __init__(self):
+        self.entities = {}
+        self.catalog = {}
+        self.pending = []
+        self._resolved = {}
+
+    def add_catalog(self, doc):
+        for obj in doc.get("data", []) + doc.get("included", []):
+            self.catalog[(obj["type"], obj["id"])] = obj
+
+    def intern(self, obj):
+        key = (obj["type"], obj["id"])
+        if key not in self.entities:
+            self.entities[key] = obj
+            self.pending.append(obj)
+
+    def lookup(self, inc_map, ref):
+        """The page's copy of an entity if it has one, else the copy an earlier page interned."""
+        if not ref:
+            return None
+        obj = get_related(inc_map, ref)
+        if obj is None:
+            key = (ref["type"], ref["id"])
+            obj = self.entities.get(key) or self.catalog.get(key)
+            if obj is None:
+                return None
+        self.intern(obj)
+        return obj
+
+    def _resolve(self, kind, ref, inc_map, build):
+        if not ref:
+            return None
+        key = (kind, ref["type"], ref["id"])
+        value = self._resolved.get(key)
+        if value is None:
+            obj = self.lookup(inc_map, ref)
+            if obj is None:
+                return None
+            value = self._resolved[key] = build(obj, inc_map)
+        return value
+
+    def name(self, ref, inc_map):
+        return self._resolve("name", ref, inc_map, lambda obj, _: obj["attributes"].get("name", ""))
 
-        all_raw.append(data)
-        inc_map = build_included_map(included)
+    def customer(self, ref, inc_map):
+        """(name, phone, email) of a customer."""
+        def build(obj, _):
+            a = obj["attributes"]
+            return a.get("name", ""), a.get("phone", "") or "", a.get("email", "") or ""
+        return self._resolve("customer", ref, inc_map, build)
 
-        for sale in sales:
-            sale_id = sale["id"]
+    def product(self, ref, inc_map):
+        """(name, cost, category ref, category name) of a product."""
+        def build(obj, inc_map):
+            cat_ref = obj.get("relationships", {}).get("productCategory", {}).get("data")
+            cat_obj = self.lookup(inc_map, cat_ref)
+            cat_name = cat_obj["attributes"].get("name", "") if cat_obj else ""
+            return obj["attributes"]["name"], obj["attributes"].get("cost", ""), cat_ref, cat_name
+        return self._resolve("product", ref, inc_map, build)
+
+    def strip(self, data):
+        """Copy of a page without the reference entities archived separately."""
+        included = [i for i in data.get("included", []) if (i["type"], i["id"]) not in self.entities]
+        return {**data, "included": included}
+
+    def drain(self):
+        """Entities interned since the last call, to append to the entity archive."""
+        pending, self.pending = self.pending, []
+        return pending
+
+
+def load_entities(path, registry=None):
+    """Seed a registry from an entity archive (later lines win)."""
+    registry = registry or EntityRegistry()
+    if os.path.exists(path):
+        for obj in fudo_json.iter_records(path):
+            registry.entities[(obj["type"], obj["id"])] = obj
+    return registry
+
+
+def load_state():
+    """Load the incremental-sync watermark and the CSV totals (empty dict if there is none yet)."""
+    if not os.path.exists(STATE_FILE):
+        return {}
+    with open(STATE_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state):
+    with open(STATE_FILE, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+
+
+def load_checkpoint():
+    if not os.path.exists(CHECKPOINT_FILE):
+        return None
+    with open(CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(checkpoint):
+    # Write-then-rename so a crash mid-write never leaves a torn checkpoint behind.
+    tmp = CHECKPOINT_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, CHECKPOINT_FILE)
+
+
+def clear_checkpoint():
+    if os.path.exists(CHECKPOINT_FILE):
+        os.remove(CHECKPOINT_FILE)
+
+
+def high_water_mark(raw_pages, state=None):
+    """Return the latest createdAt/updatedAt seen in the raw pages, merged with a previous state."""
+    state = state or {}
+    last_created = state.get("last_created_at") or ""
+    last_updated = state.get("last_updated_at") or ""
+    for page in raw_pages:
+        for sale in page.get("data", []):
             attrs = sale["attributes"]
-            rels = sale["relationships"]
-
-            # Waiter
-            waiter_ref = rels.get("waiter", {}).get("data")
-            waiter_obj = get_related(inc_map, waiter_ref)
-            waiter_name = waiter_obj["attributes"]["name"] if waiter_obj else ""
-
-            # Customer
-            customer_ref = rels.get("customer", {}).get("data")
-            customer_obj = get_related(inc_map, customer_ref)
-            customer_name_rel = customer_obj["attributes"].get("name", "") if customer_obj else ""
-            customer_name = attrs.get("customerName") or customer_name_rel or ""
-            customer_phone = ""
-            customer_email = ""
-            if customer_obj:
-                customer_phone = customer_obj["attributes"].get("phone", "") or ""
-                customer_email = customer_obj["attributes"].get("email", "") or ""
-            anon = attrs.get("anonymousCustomer")
-            if anon and not customer_name:
-                customer_name = anon.get("name", "")
-                customer_phone = anon.get("phone", "") or customer_phone
-
-            # Discounts
-            discount_refs = rels.get("discounts", {}).get("data", [])
-            discounts_total = 0.0
-            for dr in discount_refs:
-                d_obj = get_related(inc_map, dr)
-                if d_obj:
-                    discounts_total += d_obj["attributes"].get("amount", 0) or 0
-
-            # Tips
-            tip_refs = rels.get("tips", {}).get("data", [])
-            tips_total = 0.0
-            for tr in tip_refs:
-                t_obj = get_related(inc_map, tr)
-                if t_obj:
-                    tips_total += t_obj["attributes"].get("amount", 0) or 0
-
-            # Payments
-            payment_refs = rels.get("payments", {}).get("data", [])
-            payment_methods = []
-            payment_amounts = []
-            for pr in payment_refs:
-                p_obj = get_related(inc_map, pr)
-                if p_obj:
-                    p_attrs = p_obj["attributes"]
-                    pm_ref = p_obj.get("relationships", {}).get("paymentMethod", {}).get("data")
-                    pm_obj = get_related(inc_map, pm_ref)
-                    pm_name = pm_obj["attributes"]["name"] if pm_obj else ""
-                    payment_methods.append(pm_name)
-                    payment_amounts.append(str(p_attrs.get("amount", 0)))
-
-            # Items
-            item_refs = rels.get("items", {}).get("data", [])
-            if not item_refs:
-                # Sale with no items - still record it
+            last_created = max(last_created, attrs.get("createdAt") or "")
+            last_updated = max(last_updated, attrs.get("updatedAt") or "")
+    return {**state, "last_created_at": last_created, "last_updated_at": last_updated}
+
+
+def sales_url(page, created_from=None, page_size=PAGE_SIZE, include=INCLUDES, fields=None, updated_from=None):
+    url = f"{API_BASE}/sales?page%5Bsize%5D={page_size}&page%5Bnumber%5D={page}&sort=createdAt"
+    if include:
+        url += f"&include={include}"
+    for type_name, names in (fields or {}).items():
+        url += f"&fields%5B{type_name}%5D={names}"
+    if created_from:
+        # gte (not gt) so sales sharing the watermark timestamp are never skipped;
+        # the upsert by sale_id takes care of the overlap.
+        url += f"&filter%5BcreatedAt%5D=gte.{quote(created_from, safe='')}"
+    if updated_from:
+        url += f"&filter%5BupdatedAt%5D=gte.{quote(updated_from, safe='')}"
+    return url
+
+
+def fetch_page(client, page, created_from=None, page_size=PAGE_SIZE, include=INCLUDES, fields=None,
+               updated_from=None, timings=None):
+    """GET one page of /sales through the shared client (retries, re-auth and rate limiting live there)."""
+    return client.get_json(sales_url(page, created_from, page_size, include, fields, updated_from),
+                           label=f"page {page}", timings=timings)
+
+
+def probe_sparse_fieldsets(client):
+    """SLIM_FIELDS if the API accepts sparse fieldsets on /sales, else None."""
+    try:
+        fetch_page(client, 1, page_size=1, include=SLIM_INCLUDES, fields=SLIM_FIELDS)
+    except FudoAPIError as exc:
+        print(f"  Sparse fieldsets not supported ({exc}), requesting full attributes.")
+        return None
+    return SLIM_FIELDS
+
+
+def count_pages(client, first_page, created_from=None, updated_from=None):
+    """Number of PAGE_SIZE pages, from the response meta or by probing with 1-sale pages."""
+    meta = first_page.get("meta") or {}
+    for key in ("total", "count", "totalCount", "recordCount"):
+        if isinstance(meta.get(key), int):
+            return max(1, math.ceil(meta[key] / PAGE_SIZE))
+
+    def has_sale(n):
+        return bool(fetch_page(client, n, created_from, page_size=1, include="", updated_from=updated_from).get("data"))
+
+    if len(first_page.get("data", [])) < PAGE_SIZE:
+        return 1
+    # Exponential search for an empty 1-sale page, then bisect for the last sale.
+    lo, hi = PAGE_SIZE, PAGE_SIZE * 2
+    while has_sale(hi):
+        lo, hi = hi, hi * 2
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if has_sale(mid):
+            lo = mid
+        else:
+            hi = mid
+    return math.ceil(lo / PAGE_SIZE)
+
+
+def ref_id(rel_data):
+    """Integer id of a relationship reference (None when missing or non-numeric)."""
+    if not rel_data:
+        return None
+    try:
+        return int(rel_data["id"])
+    except (TypeError, ValueError):
+        return None
+
+
+def to_number(value):
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_sales_page(data, registry, timings=None):
+    """Parse one JSON:API page of sales.
+
+    Reference entities (waiters, customers, products, categories, payment methods)
+    are resolved through ``registry`` so pages that no longer carry them still parse.
+
+    Returns ``(rows, tables)``: the denormalized CSV rows (one per line item) and the
+    normalized star-schema records keyed by table name (see sales_star.SCHEMAS).
+    ``timings``, if given, receives included_s and rows_s.
+    """
+    start = time.perf_counter()
+    rows = []
+    tables = {"sales": [], "sale_items": [], "sale_payments": [], "item_subitems": []}
+    inc_map = build_included_map(data.get("included", []))
+    mapped = time.perf_counter()
+
+    for sale in data.get("data", []):
+        sale_id = sale["id"]
+        attrs = sale["attributes"]
+        rels = sale["relationships"]
+
+        # Waiter
+        waiter_ref = rels.get("waiter", {}).get("data")
+        waiter_name = registry.name(waiter_ref, inc_map) or ""
+
+        # Customer
+        customer_ref = rels.get("customer", {}).get("data")
+        customer_name_rel, customer_phone, customer_email = registry.customer(customer_ref, inc_map) or ("", "", "")
+        customer_name = attrs.get("customerName") or customer_name_rel or ""
+        anon = attrs.get("anonymousCustomer")
+        if anon and not customer_name:
+            customer_name = anon.get("name", "")
+            customer_phone = anon.get("phone", "") or customer_phone
+
+        # Discounts
+        discount_refs = rels.get("discounts", {}).get("data", [])
+        discounts_total = 0.0
+        for dr in discount_refs:
+            d_obj = get_related(inc_map, dr)
+            if d_obj:
+                discounts_total += d_obj["attributes"].get("amount", 0) or 0
+
+        # Tips
+        tip_refs = rels.get("tips", {}).get("data", [])
+        tips_total = 0.0
+        for tr in tip_refs:
+            t_obj = get_related(inc_map, tr)
+            if t_obj:
+                tips_total += t_obj["attributes"].get("amount", 0) or 0
+
+        # Payments
+        payment_refs = rels.get("payments", {}).get("data", [])
+        payment_method_ids = []
+        payment_methods = []
+        payment_amounts = []
+        for pr in payment_refs:
+            p_obj = get_related(inc_map, pr)
+            if p_obj:
+                p_attrs = p_obj["attributes"]
+                pm_ref = p_obj.get("relationships", {}).get("paymentMethod", {}).get("data")
+                pm_name = registry.name(pm_ref, inc_map) or ""
+                pm_id = ref_id(pm_ref)
+                payment_method_ids.append("" if pm_id is None else str(pm_id))
+                payment_methods.append(pm_name)
+                payment_amounts.append(str(p_attrs.get("amount", 0)))
+                tables["sale_payments"].append({
+                    "payment_id": ref_id(pr),
+                    "sale_id": ref_id(sale),
+                    "payment_method_id": pm_id,
+                    "payment_method": pm_name,
+                    "amount": to_number(p_attrs.get("amount", 0)),
+                })
+
+        tables["sales"].append({
+            "sale_id": ref_id(sale),
+            "created_at": attrs.get("createdAt") or None,
+            "closed_at": attrs.get("closedAt") or None,
+            "sale_total": to_number(attrs.get("total", 0)),
+            "sale_type": attrs.get("saleType") or None,
+            "sale_state": attrs.get("saleState") or None,
+            "people": attrs.get("people") if isinstance(attrs.get("people"), int) else None,
+            "comment": attrs.get("comment") or None,
+            "customer_id": ref_id(customer_ref),
+            "customer_name": customer_name,
+            "customer_phone": customer_phone,
+            "customer_email": customer_email,
+            "waiter_id": ref_id(waiter_ref),
+            "waiter": waiter_name,
+            "discount_total": discounts_total,
+            "tips_total": tips_total,
+        })
+
+        # Items
+        item_refs = rels.get("items", {}).get("data", [])
+        if not item_refs:
+            # Sale with no items - still record it
+            row = {
+                "sale_id": sale_id,
+                "created_at": attrs.get("createdAt", ""),
+                "closed_at": attrs.get("closedAt", ""),
+                "sale_total": attrs.get("total", 0),
+                "sale_type": attrs.get("saleType", ""),
+                "sale_state": attrs.get("saleState", ""),
+                "people": attrs.get("people", ""),
+                "comment": attrs.get("comment", ""),
+                "customer_name": customer_name,
+                "customer_phone": customer_phone,
+                "customer_email": customer_email,
+                "waiter_id": ref_id(waiter_ref),
+                "waiter": waiter_name,
+                "discount_total": discounts_total,
+                "tips_total": tips_total,
+                "payment_method_ids": "|".join(payment_method_ids),
+                "payment_methods": "|".join(payment_methods),
+                "payment_amounts": "|".join(payment_amounts),
+                "product_id": "",
+                "product_name": "",
+                "category_id": "",
+                "product_category": "",
+                "item_quantity": "",
+                "item_price": "",
+                "item_cost": "",
+                "item_comment": "",
+                "item_canceled": "",
+                "subitems": "",
+            }
+            rows.append(row)
+        else:
+            for ir in item_refs:
+                i_obj = get_related(inc_map, ir)
+                if not i_obj:
+                    continue
+                i_attrs = i_obj["attributes"]
+
+                # Product
+                prod_ref = i_obj.get("relationships", {}).get("product", {}).get("data")
+                product = registry.product(prod_ref, inc_map)
+                prod_name, prod_cost, cat_ref, cat_name = product or ("", "", None, "")
+
+                # Subitems (modifiers)
+                sub_refs = i_obj.get("relationships", {}).get("subitems", {}).get("data", [])
+                sub_names = []
+                for sr in sub_refs:
+                    s_obj = get_related(inc_map, sr)
+                    if s_obj:
+                        sp_ref = s_obj.get("relationships", {}).get("product", {}).get("data")
+                        sp_product = registry.product(sp_ref, inc_map)
+                        s_name = sp_product[0] if sp_product else f"subitem#{sr['id']}"
+                        sub_names.append(s_name)
+                        tables["item_subitems"].append({
+                            "subitem_id": ref_id(sr),
+                            "item_id": ref_id(ir),
+                            "sale_id": ref_id(sale),
+                            "product_id": ref_id(sp_ref),
+                            "product_name": s_name,
+                            "quantity": to_number(s_obj["attributes"].get("quantity")),
+                            "price": to_number(s_obj["attributes"].get("price")),
+                        })
+
+                tables["sale_items"].append({
+                    "item_id": ref_id(ir),
+                    "sale_id": ref_id(sale),
+                    "product_id": ref_id(prod_ref),
+                    "product_name": prod_name,
+                    "category_id": ref_id(cat_ref),
+                    "product_category": cat_name,
+                    "quantity": to_number(i_attrs.get("quantity")),
+                    "price": to_number(i_attrs.get("price")),
+                    "cost": to_number(prod_cost),
+                    "comment": i_attrs.get("comment") or None,
+                    "canceled": i_attrs.get("canceled") if isinstance(i_attrs.get("canceled"), bool) else None,
+                })
+
                 row = {
                     "sale_id": sale_id,
                     "created_at": attrs.get("createdAt", ""),
@@ -151,127 +497,621 @@ def fetch_all_sales(token):
                     "customer_name": customer_name,
                     "customer_phone": customer_phone,
                     "customer_email": customer_email,
+                    "waiter_id": ref_id(waiter_ref),
                     "waiter": waiter_name,
                     "discount_total": discounts_total,
                     "tips_total": tips_total,
+                    "payment_method_ids": "|".join(payment_method_ids),
                     "payment_methods": "|".join(payment_methods),
                     "payment_amounts": "|".join(payment_amounts),
-                    "product_name": "",
-                    "product_category": "",
-                    "item_quantity": "",
-                    "item_price": "",
-                    "item_cost": "",
-                    "item_comment": "",
-                    "item_canceled": "",
-                    "subitems": "",
+                    "product_id": ref_id(prod_ref),
+                    "product_name": prod_name,
+                    "category_id": ref_id(cat_ref),
+                    "product_category": cat_name,
+                    "item_quantity": i_attrs.get("quantity", ""),
+                    "item_price": i_attrs.get("price", ""),
+                    "item_cost": prod_cost,
+                    "item_comment": i_attrs.get("comment", ""),
+                    "item_canceled": i_attrs.get("canceled", ""),
+                    "subitems": "|".join(sub_names),
                 }
-                all_rows.append(row)
-            else:
-                for ir in item_refs:
-                    i_obj = get_related(inc_map, ir)
-                    if not i_obj:
-                        continue
-                    i_attrs = i_obj["attributes"]
-
-                    # Product
-                    prod_ref = i_obj.get("relationships", {}).get("product", {}).get("data")
-                    prod_obj = get_related(inc_map, prod_ref)
-                    prod_name = prod_obj["attributes"]["name"] if prod_obj else ""
-                    prod_cost = prod_obj["attributes"].get("cost", "") if prod_obj else ""
-
-                    # Product category
-                    cat_name = ""
-                    if prod_obj:
-                        cat_ref = prod_obj.get("relationships", {}).get("productCategory", {}).get("data")
-                        cat_obj = get_related(inc_map, cat_ref)
-                        if cat_obj:
-                            cat_name = cat_obj["attributes"].get("name", "")
-
-                    # Subitems (modifiers)
-                    sub_refs = i_obj.get("relationships", {}).get("subitems", {}).get("data", [])
-                    sub_names = []
-                    for sr in sub_refs:
-                        s_obj = get_related(inc_map, sr)
-                        if s_obj:
-                            sp_ref = s_obj.get("relationships", {}).get("product", {}).get("data")
-                            sp_obj = get_related(inc_map, sp_ref)
-                            s_name = sp_obj["attributes"]["name"] if sp_obj else f"subitem#{sr['id']}"
-                            sub_names.append(s_name)
-
-                    row = {
-                        "sale_id": sale_id,
-                        "created_at": attrs.get("createdAt", ""),
-                        "closed_at": attrs.get("closedAt", ""),
-                        "sale_total": attrs.get("total", 0),
-                        "sale_type": attrs.get("saleType", ""),
-                        "sale_state": attrs.get("saleState", ""),
-                        "people": attrs.get("people", ""),
-                        "comment": attrs.get("comment", ""),
-                        "customer_name": customer_name,
-                        "customer_phone": customer_phone,
-                        "customer_email": customer_email,
-                        "waiter": waiter_name,
-                        "discount_total": discounts_total,
-                        "tips_total": tips_total,
-                        "payment_methods": "|".join(payment_methods),
-                        "payment_amounts": "|".join(payment_amounts),
-                        "product_name": prod_name,
-                        "product_category": cat_name,
-                        "item_quantity": i_attrs.get("quantity", ""),
-                        "item_price": i_attrs.get("price", ""),
-                        "item_cost": prod_cost,
-                        "item_comment": i_attrs.get("comment", ""),
-                        "item_canceled": i_attrs.get("canceled", ""),
-                        "subitems": "|".join(sub_names),
-                    }
-                    all_rows.append(row)
-
-        total_sales += len(sales)
+                rows.append(row)
+
+    if timings is not None:
+        timings["included_s"] = mapped - start
+        timings["rows_s"] = time.perf_counter() - mapped
+    return rows, tables
+
+
+def fetch_all_sales(client, writer, created_from=None, workers=1, state=None, skip_ids=(), checkpoint=None,
+                    include=INCLUDES, fields=None, updated_from=None, telemetry=None):
+    """Fetch every page of sales and stream it to ``writer``, optionally with concurrent page fetchers.
+
+    Pages are always parsed and written in page order, whatever order they arrive in.
+    After each page a checkpoint is committed with the createdAt cursor of the last written
+    sale (plus the ids already written at that exact timestamp, passed back as ``skip_ids``
+    on resume) and the writer's file offsets; ``checkpoint`` holds the run parameters saved
+    alongside it. Returns ``state`` with its high-water mark advanced past what was written.
+    ``telemetry`` (an extract_telemetry.ExtractTelemetry) receives per-page phase timings.
+    """
+    watermark = high_water_mark([], state)
+    cursor = created_from
+    cursor_ids = set(skip_ids)
+
+    def fetch(n):
+        timings = telemetry.page(n) if telemetry else None
+        return fetch_page(client, n, created_from, include=include, fields=fields, updated_from=updated_from,
+                          timings=timings)
+
+    def consume(page, data):
+        nonlocal watermark, cursor, cursor_ids
+        sales = data.get("data", [])
+        if cursor_ids:
+            # Resumed run: drop sales the previous run already committed at the cursor timestamp.
+            data = {**data, "data": [s for s in sales if s["id"] not in cursor_ids]}
+        timings = telemetry.page(page) if telemetry else None
+        if data["data"]:
+            rows, tables = parse_sales_page(data, writer.registry, timings)
+            start = time.perf_counter()
+            writer.write_page(data, rows, tables)
+            if timings is not None:
+                timings.update(write_s=time.perf_counter() - start, sales=len(data["data"]), rows=len(rows))
+        watermark = high_water_mark([data], watermark)
+        for sale in data["data"]:
+            created = sale["attributes"].get("createdAt") or ""
+            if created != cursor:
+                cursor, cursor_ids = created, set()
+            cursor_ids.add(sale["id"])
+        if checkpoint is not None:
+            save_checkpoint({**checkpoint, "page": page, "cursor": cursor, "cursor_ids": sorted(cursor_ids),
+                             "state": watermark, **writer.position()})
         last_date = sales[-1]["attributes"].get("createdAt", "")
-        print(f"  Page {page}: {len(sales)} sales (total: {total_sales}) | last: {last_date}")
+        print(f"  Page {page}: {len(sales)} sales (total: {writer.sales}) | last: {last_date}")
         sys.stdout.flush()
 
+    page = 1
+    if workers > 1:
+        data = fetch(1)
+        if not data.get("data"):
+            return watermark
+        n_pages = count_pages(client, data, created_from, updated_from)
+        print(f"  {n_pages} pages to fetch with {workers} workers")
+        consume(1, data)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Bounded window of in-flight pages so a fast network can't pile up the whole history in memory.
+            pending = deque()
+            next_page = 2
+            while pending or next_page <= n_pages:
+                while next_page <= n_pages and len(pending) < workers * 2:
+                    pending.append((next_page, pool.submit(fetch, next_page)))
+                    next_page += 1
+                next_data = pending[0][1].result()
+                if not next_data.get("data"):
+                    for _, future in pending:
+                        future.cancel()
+                    break
+                page, _ = pending.popleft()
+                data = next_data
+                consume(page, data)
+
+        if len(data["data"]) < PAGE_SIZE:
+            return watermark
+        # Sales created while we were fetching: pick them up sequentially.
+        page += 1
+
+    while True:
+        data = fetch(page)
+        sales = data.get("data", [])
+        if not sales:
+            break
+
+        consume(page, data)
+
         if len(sales) < PAGE_SIZE:
             break
 
         page += 1
-        time.sleep(0.3)  # be nice to the API
 
-    return all_rows, all_raw, token
+    return watermark
+
+
+def download_reference_data(client, filenames=None):
+    """Download the reference catalogs as the JSON files convert_reference_data.py reads.
+
+    Returns the downloaded documents keyed by file name.
+    """
+    docs = {}
+    for filename in filenames or REFERENCE_ENDPOINTS:
+        path, include = REFERENCE_ENDPOINTS[filename]
+        doc = docs[filename] = client.fetch_collection(path, include=include)
+        with open(os.path.join(os.path.dirname(__file__), filename), "w", encoding="utf-8") as f:
+            f.write(fudo_json.dumps(doc))
+        print(f"  {filename}: {len(doc['data'])} records")
+    return docs
+
+
+class SalesWriter:
+    """Streams each parsed page straight to disk: CSV rows through one open DictWriter,
+    the raw page as one line of newline-delimited JSON and, when ``star_dir`` is given,
+    the normalized records as Parquet parts (see sales_star.StarWriter).
+
+    Reference entities are written once to ``entities_path`` the first time ``registry``
+    interns them and left out of the raw pages. Nothing but the registry is kept in
+    memory between pages, and everything written so far survives a crash.
+    """
+
+    def __init__(self, csv_path, raw_path, entities_path, star_dir=None, resume=None):
+        self.csv_path = csv_path
+        self.raw_path = raw_path
+        self.entities_path = entities_path
+        self.registry = EntityRegistry()
+        self.star = None
+        if star_dir:
+            self.star = sales_star.StarWriter(star_dir, resume_parts=resume["star_parts"] if resume else None)
+        self.rows = 0
+        self.sales = 0
+        self.first_created = None
+        self.last_created = None
+        if resume:
+            # Cut off anything written after the last committed page, then append.
+            for path, size in ((csv_path, resume["csv_bytes"]), (raw_path, resume["raw_bytes"]),
+                               (entities_path, resume["entities_bytes"])):
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+            # Pages already written reference entities from the archive, which a replay
+            # reads first; this run's registry re-interns whatever it needs.
+            self._csv = open(csv_path, "a", newline="", encoding="utf-8")
+            self._raw = open(raw_path, "a", encoding="utf-8")
+            self._entities = open(entities_path, "a", encoding="utf-8")
+            self._writer = csv.DictWriter(self._csv, fieldnames=SALES_FIELDS)
+            for key in ("rows", "sales", "first_created", "last_created"):
+                setattr(self, key, resume[key])
+        else:
+            self._csv = open(csv_path, "w", newline="", encoding="utf-8")
+            self._raw = open(raw_path, "w", encoding="utf-8")
+            self._entities = open(entities_path, "w", encoding="utf-8")
+            self._writer = csv.DictWriter(self._csv, fieldnames=SALES_FIELDS)
+            self._writer.writeheader()
+
+    def write_page(self, data, rows, tables):
+        if self.star:
+            self.star.write_page(tables)
+        self._writer.writerows(rows)
+        for obj in self.registry.drain():
+            self._entities.write(fudo_json.dumps(obj))
+            self._entities.write("\n")
+        self._raw.write(fudo_json.dumps(self.registry.strip(data)))
+        self._raw.write("\n")
+        self._csv.flush()
+        self._entities.flush()
+        self._raw.flush()
+
+        self.rows += len(rows)
+        self.sales += len(data.get("data", []))
+        if rows:
+            self.first_created, self.last_created = date_range(rows, self.first_created, self.last_created)
+
+    def position(self):
+        """Byte offsets and counters of everything flushed so far, for the checkpoint."""
+        return {
+            "csv_bytes": self._csv.tell(),
+            "raw_bytes": self._raw.tell(),
+            "entities_bytes": self._entities.tell(),
+            "rows": self.rows,
+            "sales": self.sales,
+            "first_created": self.first_created,
+            "last_created": self.last_created,
+            "star_parts": self.star.parts if self.star else None,
+        }
+
+    def finalize(self):
+        if self.star:
+            self.star.finalize()
+
+    def close(self):
+        self._csv.close()
+        self._raw.close()
+        self._entities.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def date_range(rows, first=None, last=None):
+    """(min, max) created_at of ``rows``, widened by a previous ``first``/``last``."""
+    created = [row["created_at"] for row in rows] + [value for value in (first, last) if value]
+    return (min(created), max(created)) if created else (None, None)
+
+
+def sale_key(row):
+    """Sort key of a sale in the CSV, which is in created_at order (ties by sale_id)."""
+    return row["created_at"], int(row["sale_id"])
+
+
+def sale_groups(rows):
+    """Yield ``(sale_key, rows)`` for each sale of ``rows``, whose rows are consecutive."""
+    for _, group in groupby(rows, key=itemgetter("sale_id")):
+        group = list(group)
+        yield sale_key(group[0]), group
+
+
+def write_merged(path, *streams):
+    """Write the ``(sale_key, rows)`` streams, each in key order, to ``path`` as one CSV in key order.
+
+    Returns the totals of the result: ``{"sales", "rows", "first_created_at", "last_created_at"}``.
+    """
+    sales = rows = 0
+    first = last = None
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        writer = csv.DictWriter(out, fieldnames=SALES_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for _, group in heapq.merge(*streams, key=itemgetter(0)):
+            writer.writerows(group)
+            sales += 1
+            rows += len(group)
+            first, last = date_range(group, first, last)
+    return {"sales": sales, "rows": rows, "first_created_at": first, "last_created_at": last}
+
+
+def csv_totals(path):
+    """Totals of a sales CSV (as returned by write_merged), for a state that does not keep them yet."""
+    sales = rows = 0
+    first = last = None
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        for _, group in sale_groups(csv.DictReader(f)):
+            sales += 1
+            rows += len(group)
+            first, last = date_range(group, first, last)
+    return {"sales": sales, "rows": rows, "first_created_at": first, "last_created_at": last}
+
+
+def sale_fingerprints(path, only=None):
+    """sale_id -> digest of all its CSV rows, for the sales in ``only`` (default: all)."""
+    hashes = {}
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            sale_id = row["sale_id"]
+            if only is None or sale_id in only:
+                h = hashes.get(sale_id) or hashes.setdefault(sale_id, hashlib.blake2b(digest_size=16))
+                h.update("\x1f".join(row.get(k) or "" for k in SALES_FIELDS).encode("utf-8") + b"\x1e")
+    return {sale_id: h.digest() for sale_id, h in hashes.items()}
+
+
+def merge_delta(delta_csv, delta_raw, delta_entities, totals=None):
+    """Apply a delta extraction to the main outputs by sale_id, streaming both files.
+
+    Re-fetched sales whose rows are unchanged are dropped; new and changed sales are
+    merged into the CSV at their created_at position (a changed sale keeps its place)
+    and appended to the raw archive (later lines win for a repeated id). When nothing
+    changed the CSV is not read again: ``totals`` (those kept in the state, or counted
+    from the CSV if there are none yet) are returned as they are.
+
+    Returns ``(changed, new, totals)``: the ids of the new or changed sales, how many of
+    them are new, and the totals of the resulting CSV (see write_merged).
+    """
+    fetched = sale_fingerprints(delta_csv)
+    stored = sale_fingerprints(OUTPUT_CSV, only=fetched)
+    changed = {sale_id for sale_id, digest in fetched.items() if stored.get(sale_id) != digest}
+    new = sum(sale_id not in stored for sale_id in changed)
+
+    if changed:
+        tmp = OUTPUT_CSV + ".tmp"
+        with open(OUTPUT_CSV, "r", newline="", encoding="utf-8") as old, \
+                open(delta_csv, "r", newline="", encoding="utf-8") as delta:
+            kept = ((key, rows) for key, rows in sale_groups(csv.DictReader(old)) if rows[0]["sale_id"] not in changed)
+            updates = ((key, rows) for key, rows in sale_groups(csv.DictReader(delta)) if rows[0]["sale_id"] in changed)
+            totals = write_merged(tmp, kept, updates)
+        os.replace(tmp, OUTPUT_CSV)
+    elif totals is None:
+        totals = csv_totals(OUTPUT_CSV)
+
+    with open(OUTPUT_JSON, "a", encoding="utf-8") as out, open(delta_raw, "r", encoding="utf-8") as f:
+        for line in f:
+            page = fudo_json.loads(line)
+            page["data"] = [sale for sale in page["data"] if sale["id"] in changed]
+            if page["data"]:
+                out.write(fudo_json.dumps(page))
+                out.write("\n")
+    with open(OUTPUT_ENTITIES, "a", encoding="utf-8") as out, open(delta_entities, "r", encoding="utf-8") as f:
+        shutil.copyfileobj(f, out)
+    for path in (delta_csv, delta_raw, delta_entities):
+        os.remove(path)
+    return changed, new, totals
+
+
+def shift_timestamp(value, days):
+    """An ISO-8601 timestamp moved by ``days`` days, in UTC."""
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return (dt + timedelta(days=days)).astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def read_archive(path):
+    """Yield the pages of a raw archive: NDJSON lines (left undecoded for the workers)
+    or, for the legacy fudo_sales_raw.json, the pages of its JSON list, streamed one by one."""
+    if fudo_json.is_array_file(path):
+        return fudo_json.iter_array(path)
+    return fudo_json.iter_lines(path)
+
+
+def decode_page(page):
+    return fudo_json.loads(page) if isinstance(page, str) else page
+
+
+def batched(iterable, n):
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, n))
+        if not batch:
+            return
+        yield batch
+
+
+def ordered_map(pool, fn, tasks, window):
+    """pool.submit fn over tasks with at most ``window`` in flight, yielding results in order."""
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.submit(fn, task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+_replay_registry = None
+
+
+def _init_replay_worker(entities_path):
+    global _replay_registry
+    _replay_registry = load_entities(entities_path)
+
+
+def _replay_sale_ids(pages):
+    return [[sale["id"] for sale in decode_page(page).get("data", [])] for page in pages]
+
+
+def _replay_parse(batch):
+    """Worker: parse a batch of (page, superseded sale ids) from the archive."""
+    results = []
+    for page, skip in batch:
+        data = decode_page(page)
+        if skip:
+            data = {**data, "data": [sale for sale in data["data"] if sale["id"] not in skip]}
+        results.append(parse_sales_page(data, _replay_registry))
+    return results
+
+
+def replay_archive(path, workers, star_dir=None):
+    """Rebuild the CSV (and star schema) from a raw archive without touching the API.
+
+    Pages are parsed on a process pool and written in archive order. A sale re-fetched by
+    an incremental run appears more than once; only its last copy is kept, and like
+    merge_delta does it goes back to its created_at position: sales that come after a
+    later one in the archive are held back and merged in at the end.
+    Returns the CSV totals (see write_merged).
+    """
+    window = workers * 2
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_replay_worker,
+                             initargs=(OUTPUT_ENTITIES,)) as pool:
+        # Pass 1: which archive page holds the last copy of every sale.
+        page_ids = []
+        for ids in ordered_map(pool, _replay_sale_ids, batched(read_archive(path), REPLAY_BATCH), window):
+            page_ids.extend(ids)
+        last_page = {}
+        for i, ids in enumerate(page_ids):
+            for sale_id in ids:
+                last_page[sale_id] = i
+        superseded = [{sale_id for sale_id in ids if last_page[sale_id] != i} for i, ids in enumerate(page_ids)]
+        print(f"  {len(page_ids)} pages, {len(last_page)} unique sales")
+
+        # Pass 2: parse and write in archive order, holding back the out-of-order sales.
+        sales = rows = 0
+        first = last = top = None
+        late = []
+        star = sales_star.StarWriter(star_dir) if star_dir else None
+        tmp = OUTPUT_CSV + ".tmp"
+        with open(tmp, "w", newline="", encoding="utf-8") as out:
+            writer = csv.DictWriter(out, fieldnames=SALES_FIELDS)
+            writer.writeheader()
+            tasks = batched(zip(read_archive(path), superseded), REPLAY_BATCH)
+            for results in ordered_map(pool, _replay_parse, tasks, window):
+                for page_rows, tables in results:
+                    for key, group in sale_groups(page_rows):
+                        if top is not None and key < top:
+                            late.append((key, group))
+                        else:
+                            writer.writerows(group)
+                            top = key
+                    if star:
+                        star.write_page(tables)
+                    rows += len(page_rows)
+                    sales += len(tables["sales"])
+                    first, last = date_range(page_rows, first, last)
+        if late:
+            print(f"  {len(late)} re-fetched sales moved back to their created_at position")
+            late.sort(key=itemgetter(0))
+            with open(tmp, "r", newline="", encoding="utf-8") as f:
+                write_merged(OUTPUT_CSV + ".merged", sale_groups(csv.DictReader(f)), late)
+            os.replace(OUTPUT_CSV + ".merged", OUTPUT_CSV)
+            os.remove(tmp)
+        else:
+            os.replace(tmp, OUTPUT_CSV)
+        if star:
+            star.finalize()
+    return {"sales": sales, "rows": rows, "first_created_at": first, "last_created_at": last}
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Extract FUDO sales to CSV/JSON.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only fetch sales created since the saved watermark and upsert them by sale_id")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of pages fetched concurrently (default: 1, sequential; "
+                             "--replay defaults to one process per CPU)")
+    parser.add_argument("--reference", action="store_true",
+                        help="also download the reference catalogs (products, categories, users, ...)")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted run from its last committed page")
+    parser.add_argument("--slim", action="store_true",
+                        help="download the reference catalogs once and fetch sales with relationship ids only")
+    parser.add_argument("--rescan-days", type=int, metavar="N",
+                        help="incremental run that also re-fetches the N days before the watermark, "
+                             "to pick up sales that changed after they were extracted")
+    parser.add_argument("--changes", action="store_true",
+                        help="incremental run over sales updated since the saved updatedAt watermark "
+                             "(new sales included)")
+    parser.add_argument("--metrics-file", default=METRICS_FILE, metavar="PATH",
+                        help="Prometheus textfile for the run metrics (default: %(default)s)")
+    parser.add_argument("--replay", nargs="?", const=OUTPUT_JSON, metavar="ARCHIVE",
+                        help="rebuild the CSV and star schema from a raw archive (default: %(const)s) "
+                             "without calling the API")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("FUDO Sales Extractor - Mocawa Cafe")
     print("=" * 60)
 
-    token = authenticate()
+    if args.replay:
+        workers = args.workers or os.cpu_count() or 1
+        star_dir = sales_star.STAR_DIR if sales_star else None
+        print(f"\nReplaying {args.replay} with {workers} processes...\n")
+        totals = replay_archive(args.replay, workers, star_dir)
+        print(f"\nCSV saved: {OUTPUT_CSV}")
+        print(f"  {totals['sales']} sales, {totals['rows']} rows (line items)")
+        if star_dir:
+            print(f"Star schema saved: {star_dir}/{{{','.join(sales_star.TABLES)}}}.parquet")
+        print(f"  Date range: {totals['first_created_at']} to {totals['last_created_at']}")
+        state = load_state()
+        state["csv"] = totals
+        save_state(state)
+        print("\nDone!")
+        return
+    workers = args.workers or 1
 
-    print(f"\nFetching all sales (page size {PAGE_SIZE})...\n")
-    rows, raw_data, token = fetch_all_sales(token)
+    state = load_state()
+    incremental = args.incremental or args.changes or args.rescan_days is not None
+    slim = args.slim
+    created_from = updated_from = None
+    if args.changes:
+        updated_from = state.get("last_updated_at")
+    elif incremental:
+        created_from = state.get("last_created_at")
+        if created_from and args.rescan_days:
+            created_from = shift_timestamp(created_from, -args.rescan_days)
+    if args.resume:
+        checkpoint = load_checkpoint()
+        if checkpoint is None:
+            print("No checkpoint found, starting from scratch.")
+    else:
+        # This run rewrites the outputs: a previous run's checkpoint no longer matches them,
+        # even if this one dies before committing its first page.
+        clear_checkpoint()
+        checkpoint = None
+    if checkpoint:
+        incremental = checkpoint["incremental"]
+        created_from = checkpoint["created_from"]
+        updated_from = checkpoint.get("updated_from")
+        state = checkpoint["state"]
+        slim = checkpoint.get("slim", False)
+        print(f"Resuming after page {checkpoint['page']} ({checkpoint['sales']} sales committed, "
+              f"cursor {checkpoint['cursor']})")
+    elif incremental and not ((created_from or updated_from) and os.path.exists(OUTPUT_CSV)):
+        print("No watermark or existing CSV found, running a full extraction instead.")
+        incremental, created_from, updated_from = False, None, None
 
-    # Write CSV
-    if rows:
-        fieldnames = list(rows[0].keys())
-        with open(OUTPUT_CSV, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(rows)
+    client = make_client(workers)
+    client.authenticate()
+
+    catalogs = {}
+    if args.reference:
+        print("\nDownloading reference data...")
+        catalogs = download_reference_data(client)
+
+    include, fields = INCLUDES, None
+    if slim:
+        if not args.reference:
+            print("\nDownloading reference catalogs for the local join...")
+            catalogs = download_reference_data(client, SLIM_CATALOGS)
+        include, fields = SLIM_INCLUDES, probe_sparse_fieldsets(client)
+
+    star_dir = None
+    if sales_star is None:
+        print("pyarrow not installed, skipping the Parquet star schema.")
+    elif checkpoint:
+        star_dir = checkpoint["star_dir"]
+    elif incremental and not os.path.exists(os.path.join(sales_star.STAR_DIR, "sales.parquet")):
+        print("No star schema to upsert into yet, skipping it (run a full extraction to build it).")
+    else:
+        star_dir = sales_star.STAR_DIR + (".delta" if incremental else "")
+
+    if incremental:
+        since = f"updated since {updated_from}" if updated_from else f"created since {created_from}"
+        print(f"\nFetching sales {since} (page size {PAGE_SIZE})...\n")
+        csv_path, raw_path, entities_path = OUTPUT_CSV + ".delta", OUTPUT_JSON + ".delta", OUTPUT_ENTITIES + ".delta"
+    else:
+        print(f"\nFetching all sales (page size {PAGE_SIZE})...\n")
+        csv_path, raw_path, entities_path = OUTPUT_CSV, OUTPUT_JSON, OUTPUT_ENTITIES
+
+    run = {"incremental": incremental, "created_from": created_from, "updated_from": updated_from,
+           "star_dir": star_dir, "slim": slim}
+    telemetry = ExtractTelemetry("changes" if updated_from else "incremental" if incremental else "full")
+    with SalesWriter(csv_path, raw_path, entities_path, star_dir=star_dir, resume=checkpoint) as writer:
+        if slim:
+            for filename in SLIM_CATALOGS:
+                writer.registry.add_catalog(catalogs[filename])
+        state = fetch_all_sales(
+            client, writer,
+            created_from=checkpoint["cursor"] if checkpoint else created_from,
+            workers=workers, state=state,
+            skip_ids=checkpoint["cursor_ids"] if checkpoint else (),
+            checkpoint=run, include=include, fields=fields, updated_from=updated_from, telemetry=telemetry,
+        )
+    writer.finalize()
+
+    if not incremental:
+        n_sales, n_rows, first, last = writer.sales, writer.rows, writer.first_created, writer.last_created
+        state["csv"] = {"sales": n_sales, "rows": n_rows, "first_created_at": first, "last_created_at": last}
         print(f"\nCSV saved: {OUTPUT_CSV}")
-        print(f"  {len(rows)} rows (line items)")
+        print(f"  {n_rows} rows (line items)")
+        print(f"Raw pages saved: {OUTPUT_JSON} (reference entities: {OUTPUT_ENTITIES})")
+        if star_dir:
+            print(f"Star schema saved: {star_dir}/{{{','.join(sales_star.TABLES)}}}.parquet")
+    elif writer.sales:
+        changed, new, totals = merge_delta(csv_path, raw_path, entities_path, state.get("csv"))
+        state["csv"] = totals
+        n_sales, n_rows, first, last = (totals[key] for key in
+                                        ("sales", "rows", "first_created_at", "last_created_at"))
+        if star_dir:
+            sales_star.merge_star(star_dir, sale_ids=[int(sale_id) for sale_id in changed])
+        print(f"\nCSV {'updated' if changed else 'unchanged'}: {OUTPUT_CSV}")
+        print(f"  {writer.sales} sales fetched: {new} new, {len(changed) - new} changed, "
+              f"{writer.sales - len(changed)} unchanged")
+    else:
+        os.remove(csv_path)
+        os.remove(raw_path)
+        os.remove(entities_path)
+        if star_dir:
+            shutil.rmtree(star_dir)
+        n_rows = 0
+        print("\nNo new sales since the last run.")
+    clear_checkpoint()
+
+    client.close()
+    save_state(state)
+    print(f"Watermark: createdAt={state['last_created_at']} updatedAt={state['last_updated_at']}")
 
-    # Write raw JSON
-    with open(OUTPUT_JSON, "w", encoding="utf-8") as f:
-        json.dump(raw_data, f, ensure_ascii=False)
-    print(f"Raw JSON saved: {OUTPUT_JSON}")
+    print_summary(telemetry.write(client.stats, REPORT_JSON, args.metrics_file))
+    print(f"Run report: {REPORT_JSON} (metrics: {args.metrics_file})")
 
     # Summary
-    sale_ids = set(r["sale_id"] for r in rows)
-    print(f"\nSummary:")
-    print(f"  Total unique sales: {len(sale_ids)}")
-    print(f"  Total line items: {len(rows)}")
-    if rows:
-        print(f"  Date range: {rows[0]['created_at']} to {rows[-1]['created_at']}")
+    if n_rows:
+        print(f"\nSummary:")
+        print(f"  Total unique sales: {n_sales}")
+        print(f"  Total line items: {n_rows}")
+        print(f"  Date range: {first} to {last}")
     print("\nDone!")
 
 
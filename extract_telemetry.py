@@ -0,0 +1,129 @@
+"""
+extract_telemetry.py — Run report for extract_fudo_sales.py.
+
+Collects, for every sales page, the time spent on the network (including
+retries), JSON decoding, building the included map, building rows and writing,
+plus the payload size, and combines them with the API client's counters
+(requests, retries, 401 re-auths, responses by status, non-2xx responses and
+transport errors counted apart) into:
+
+    fudo_extract_report.json   per-page records, phase totals and percentiles
+    fudo_extract.prom          Prometheus textfile (node_exporter textfile collector)
+"""
+
+import json
+import os
+import threading
+import time
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+REPORT_JSON = os.path.join(BASE, "fudo_extract_report.json")
+METRICS_FILE = os.path.join(BASE, "fudo_extract.prom")
+
+PHASES = ["network", "decode", "included", "rows", "write"]
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def write_atomic(path, text):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+class ExtractTelemetry:
+    """Per-page timing records, filled in from the fetch threads and the writer loop."""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.pages = {}
+        self._lock = threading.Lock()
+
+    def page(self, n):
+        """The (shared) timing record of page ``n``."""
+        with self._lock:
+            return self.pages.setdefault(n, {"page": n})
+
+    def report(self, client_stats):
+        pages = [self.pages[n] for n in sorted(self.pages)]
+        phases = {}
+        for phase in PHASES:
+            values = [p.get(f"{phase}_s", 0.0) for p in pages]
+            phases[phase] = {
+                "total_s": sum(values),
+                "p50_s": percentile(values, 0.5),
+                "p95_s": percentile(values, 0.95),
+                "max_s": max(values, default=0.0),
+            }
+        status = client_stats["status"]
+        return {
+            "mode": self.mode,
+            "started_at": self.started,
+            "duration_s": time.perf_counter() - self._start,
+            "pages": len(pages),
+            "sales": sum(p.get("sales", 0) for p in pages),
+            "rows": sum(p.get("rows", 0) for p in pages),
+            "bytes": sum(p.get("bytes", 0) for p in pages),
+            "phases": phases,
+            "requests": client_stats["requests"],
+            "retries": client_stats["retries"],
+            "reauths": client_stats["reauths"],
+            # HTTP error responses (non-2xx) and requests that got no response at all.
+            "non_200": sum(n for code, n in status.items() if code.isdigit() and not code.startswith("2")),
+            "transport_errors": sum(n for code, n in status.items() if not code.isdigit()),
+            "status": dict(status),
+            "page_records": pages,
+        }
+
+    def write(self, client_stats, json_path=REPORT_JSON, metrics_path=METRICS_FILE):
+        """Write the JSON report and the Prometheus textfile; returns the report."""
+        report = self.report(client_stats)
+        write_atomic(json_path, json.dumps(report, indent=2))
+
+        labels = f'mode="{self.mode}"'
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for extra, value in samples:
+                lines.append(f"{name}{{{labels}{extra}}} {value}")
+
+        metric("fudo_extract_duration_seconds", "gauge", "Wall time of the last extraction run.",
+               [("", f"{report['duration_s']:.3f}")])
+        metric("fudo_extract_last_run_timestamp_seconds", "gauge", "Start time of the last extraction run.",
+               [("", f"{self.started:.0f}")])
+        for key, help_text in (("pages", "Sales pages fetched"), ("sales", "Sales fetched"),
+                               ("rows", "CSV rows (line items) written"), ("bytes", "Bytes of sales pages received")):
+            metric(f"fudo_extract_{key}", "gauge", f"{help_text} by the last run.", [("", report[key])])
+        metric("fudo_extract_phase_seconds", "gauge", "Time spent per phase in the last run, summed over pages.",
+               [(f',phase="{phase}"', f"{v['total_s']:.3f}") for phase, v in report["phases"].items()])
+        metric("fudo_extract_page_phase_p95_seconds", "gauge", "95th percentile of the per-page time per phase.",
+               [(f',phase="{phase}"', f"{v['p95_s']:.4f}") for phase, v in report["phases"].items()])
+        for key, help_text in (("requests", "HTTP requests sent"), ("retries", "Requests retried"),
+                               ("reauths", "Re-authentications after a 401"),
+                               ("non_200", "Non-2xx HTTP responses"),
+                               ("transport_errors", "Requests that got no response (timeouts, connection errors)")):
+            metric(f"fudo_extract_{key}", "gauge", f"{help_text} in the last run.", [("", report[key])])
+        metric("fudo_extract_responses", "gauge", "Responses (or transport errors) by status in the last run.",
+               [(f',status="{code}"', n) for code, n in sorted(report["status"].items())])
+        write_atomic(metrics_path, "\n".join(lines) + "\n")
+        return report
+
+
+def print_summary(report):
+    if not report["pages"]:
+        return
+    print(f"\nTelemetry ({report['pages']} pages, {report['bytes'] / 1e6:.1f} MB, {report['duration_s']:.1f}s):")
+    for phase, v in report["phases"].items():
+        print(f"  {phase:<9} {v['total_s']:8.2f}s  p50 {v['p50_s'] * 1000:7.1f} ms  p95 {v['p95_s'] * 1000:7.1f} ms")
+    print(f"  requests {report['requests']}, retries {report['retries']}, re-auths {report['reauths']}, "
+          f"non-200 {report['non_200']}, transport errors {report['transport_errors']}")
@@ -0,0 +1,221 @@
+"""
+fudo_client.py — Shared HTTP client for the FUDO API.
+
+One keep-alive requests.Session with a connection pool, a token-bucket rate
+limiter that slows down on 429 / Retry-After, and capped exponential backoff
+with jitter for timeouts and 5xx responses. ``FudoClient.stats`` counts
+requests, retries, re-authentications and responses by status.
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from fudo_json import response_json
+
+
+class FudoAPIError(Exception):
+    """A request failed with a non-retryable status or ran out of attempts."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket whose rate adapts to the server's throttling.
+
+    Every 429 halves the rate (down to ``min_rate``) and holds all callers
+    until ``Retry-After`` has passed; every success nudges the rate back up
+    towards the configured ``rate``.
+    """
+
+    def __init__(self, rate, capacity=None, min_rate=0.5):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.capacity = capacity or max(1.0, self.max_rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self.updated:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    # Paused by a Retry-After
+                    wait = self.updated - now
+            time.sleep(wait)
+
+    def throttle(self, retry_after=None):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0
+            self.updated = max(self.updated, time.monotonic() + (retry_after or 0))
+
+    def recover(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class FudoClient:
+    RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+    def __init__(self, api_key, api_secret, api_base, auth_url, rate=4.0, pool_size=16,
+                 timeout=60, max_attempts=6, backoff_base=1.0, backoff_cap=60.0):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.api_base = api_base.rstrip("/")
+        self.auth_url = auth_url
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.limiter = TokenBucket(rate)
+        self.token = None
+        self._token_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "reauths": 0, "status": {}}
+        self._stats_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Accept": "application/json"})
+
+    def close(self):
+        self.session.close()
+
+    def count(self, key, status=None):
+        with self._stats_lock:
+            if status is None:
+                self.stats[key] += 1
+            else:
+                self.stats[key][status] = self.stats[key].get(status, 0) + 1
+
+    def authenticate(self):
+        print("Authenticating...")
+        r = self.request("POST", self.auth_url, authorized=False,
+                         json={"apiKey": self.api_key, "apiSecret": self.api_secret},
+                         headers={"Content-Type": "application/json"})
+        data = response_json(r)
+        print(f"Token obtained, expires at {data.get('exp')}")
+        self.token = data["token"]
+        return self.token
+
+    def refresh_token(self, stale):
+        """Re-authenticate once for all threads that saw the same expired token."""
+        with self._token_lock:
+            if self.token == stale:
+                print("  Token expired, re-authenticating...")
+                self.count("reauths")
+                self.authenticate()
+            return self.token
+
+    def backoff(self, attempt):
+        """Capped exponential backoff with full jitter."""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def request(self, method, url, authorized=True, label=None, **kwargs):
+        label = label or url
+        extra_headers = kwargs.pop("headers", {})
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            token = self.token
+            headers = dict(extra_headers)
+            if authorized:
+                headers["Authorization"] = f"Bearer {token}"
+
+            delay = None
+            self.count("requests")
+            try:
+                r = self.session.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as exc:
+                reason = type(exc).__name__
+                self.count("status", reason)
+            else:
+                self.count("status", str(r.status_code))
+                if r.status_code < 300:
+                    self.limiter.recover()
+                    return r
+                if r.status_code == 401 and authorized:
+                    self.refresh_token(token)
+                    reason = "401"
+                    delay = 0
+                elif r.status_code in self.RETRY_STATUSES:
+                    reason = f"Error {r.status_code}"
+                    if r.status_code == 429:
+                        delay = parse_retry_after(r.headers.get("Retry-After"))
+                        self.limiter.throttle(delay)
+                else:
+                    raise FudoAPIError(f"{method} {label}: HTTP {r.status_code}: {r.text[:200]}")
+
+            attempt += 1
+            if attempt >= self.max_attempts:
+                raise FudoAPIError(f"{method} {label}: giving up after {attempt} attempts ({reason})")
+            self.count("retries")
+            if delay is None:
+                delay = self.backoff(attempt)
+            if delay:
+                print(f"  {reason} on {label}, retry {attempt}/{self.max_attempts - 1} in {delay:.1f}s...")
+                time.sleep(delay)
+
+    def get_json(self, path_or_url, params=None, label=None, timings=None):
+        """GET and decode a JSON document; ``timings``, if given, receives network_s
+        (including retries), decode_s and bytes."""
+        url = path_or_url if "://" in path_or_url else f"{self.api_base}{path_or_url}"
+        start = time.perf_counter()
+        r = self.request("GET", url, params=params, label=label)
+        if timings is None:
+            return response_json(r)
+        received = time.perf_counter()
+        data = response_json(r)
+        timings["network_s"] = received - start
+        timings["decode_s"] = time.perf_counter() - received
+        timings["bytes"] = len(r.content)
+        return data
+
+    def fetch_collection(self, path, include=None, page_size=500):
+        """Page through a JSON:API collection and merge it into one {"data", "included"} document."""
+        data, included, seen = [], [], set()
+        page = 1
+        while True:
+            params = {"page[size]": page_size, "page[number]": page}
+            if include:
+                params["include"] = include
+            doc = self.get_json(path, params=params, label=f"{path} page {page}")
+            batch = doc.get("data", [])
+            data.extend(batch)
+            for item in doc.get("included", []):
+                key = (item["type"], str(item["id"]))
+                if key not in seen:
+                    seen.add(key)
+                    included.append(item)
+            if len(batch) < page_size:
+                break
+            page += 1
+        return {"data": data, "included": included}
@@ -0,0 +1,107 @@
+"""
+fudo_json.py — JSON layer shared by the extractor, --replay and convert_reference_data.py.
+
+Decodes and encodes with orjson when it is installed and falls back to the
+stdlib json module otherwise. Large archives can be read record by record:
+iter_records() walks NDJSON line by line, and a top-level JSON array (the
+legacy fudo_sales_raw.json) element by element, with ijson if installed or an
+incremental stdlib decoder, so the whole file is never held in memory.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+BACKEND = "orjson" if orjson else "json"
+CHUNK_SIZE = 1 << 20
+
+
+if orjson:
+    def loads(data):
+        return orjson.loads(data)
+
+    def dumps(obj):
+        return orjson.dumps(obj).decode("utf-8")
+else:
+    def loads(data):
+        return json.loads(data)
+
+    def dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def load(path):
+    """Decode a whole JSON file."""
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def response_json(response):
+    """Decode a requests.Response body (replaces ``response.json()``)."""
+    return loads(response.content)
+
+
+def is_array_file(path):
+    with open(path, "rb") as f:
+        head = f.read(64).lstrip()
+    return head.startswith(b"[")
+
+
+def iter_lines(path):
+    """Yield the raw non-empty lines of an NDJSON file, undecoded."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield line
+
+
+def iter_array(path):
+    """Yield the decoded elements of a top-level JSON array without loading the whole file."""
+    if ijson:
+        with open(path, "rb") as f:
+            yield from ijson.items(f, "item", use_float=True)
+        return
+
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = f.read(CHUNK_SIZE).lstrip()
+        if not buf.startswith("["):
+            raise ValueError(f"{path}: not a JSON array")
+        buf, pos, eof = buf[1:], 0, False
+        while True:
+            # Skip separators between elements.
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                value, end = None, None
+            # A value running up to the end of the buffer may be truncated: read more first.
+            if end is None or (end == len(buf) and not eof):
+                if eof:
+                    raise ValueError(f"{path}: truncated JSON array")
+                chunk = f.read(CHUNK_SIZE)
+                eof = not chunk
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            yield value
+            pos = end
+
+
+def iter_records(path):
+    """Yield the decoded records of an archive: NDJSON lines or the elements of a JSON array."""
+    if is_array_file(path):
+        yield from iter_array(path)
+    else:
+        for line in iter_lines(path):
+            yield loads(line)
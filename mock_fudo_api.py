@@ -0,0 +1,354 @@
+"""
+mock_fudo_api.py — Local stand-in for the FUDO auth and JSON:API endpoints.
+
+Serves deterministic synthetic sales (with items, subitems, payments, discounts,
+tips, waiters, customers) and the reference catalogs, honouring page[size],
+page[number], include, fields[...] and filter[createdAt|updatedAt]=gte.<iso>.
+With --revision N, a deterministic 5% of the newest sales are edited after the
+fact (an extra tip, a CANCELED state) and get a later updatedAt, to exercise
+the extractor's change-data capture.
+
+Usage:
+    python mock_fudo_api.py --sales 50000 --latency 80 --token-ttl 60 --error-rate 0.02
+
+    FUDO_API_BASE=http://127.0.0.1:8765/v1alpha1 FUDO_AUTH_URL=http://127.0.0.1:8765/api \\
+        python extract_fudo_sales.py --workers 4
+
+GET /_stats returns request, byte and status counters (see bench_extract.py).
+"""
+
+import argparse
+import json
+import random
+import secrets
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+START = datetime(2024, 1, 1, 8, 0, tzinfo=timezone.utc)
+SALE_INTERVAL = timedelta(minutes=9)
+
+PRODUCTS = 120
+CATEGORIES = 12
+WAITERS = 8
+CUSTOMERS = 400
+PAYMENT_METHODS = ["Efectivo", "Tarjeta de débito", "Tarjeta de crédito", "Mercado Pago", "Transferencia"]
+SALE_TYPES = ["EAT-IN", "TAKEAWAY", "DELIVERY"]
+EDITABLE_FRACTION = 0.2  # --revision edits only happen among the newest 20% of sales
+
+
+def iso(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def ref(type_name, id_):
+    return {"type": type_name, "id": str(id_)}
+
+
+class SyntheticData:
+    """Deterministic sales and catalogs: sale ``i`` is always generated the same way for a given seed."""
+
+    def __init__(self, n_sales, seed=0, revision=0):
+        self.n_sales = n_sales
+        self.seed = seed
+        self.revision = revision
+        self.created = [iso(START + i * SALE_INTERVAL) for i in range(n_sales)]
+        self.updated = [iso(START + i * SALE_INTERVAL + timedelta(minutes=95)) for i in range(n_sales)]
+        first_editable = int(n_sales * (1 - EDITABLE_FRACTION))
+        self.edited = {i for r in range(1, revision + 1)
+                       for i in random.Random(seed * 7919 + r).sample(range(first_editable, n_sales),
+                                                                      (n_sales - first_editable) // 20)}
+        edited_at = iso(START + n_sales * SALE_INTERVAL + timedelta(minutes=95, hours=revision))
+        for i in self.edited:
+            self.updated[i] = edited_at
+        rng = random.Random(seed)
+        self.catalogs = {
+            "ProductCategory": [self.resource("ProductCategory", c, {"name": f"Categoría {c}"})
+                                for c in range(1, CATEGORIES + 1)],
+            "Product": [self.resource("Product", p, {"name": f"Producto {p}", "cost": rng.randint(200, 3000),
+                                                     "price": rng.randint(1500, 9000), "active": True},
+                                      {"productCategory": {"data": ref("ProductCategory", 1 + p % CATEGORIES)}})
+                        for p in range(1, PRODUCTS + 1)],
+            "User": [self.resource("User", w, {"name": f"Mozo {w}", "email": f"mozo{w}@example.com"})
+                     for w in range(1, WAITERS + 1)],
+            "PaymentMethod": [self.resource("PaymentMethod", m, {"name": name})
+                              for m, name in enumerate(PAYMENT_METHODS, 1)],
+            "Customer": [self.resource("Customer", c, {"name": f"Cliente {c}", "phone": f"11{c:08d}",
+                                                       "email": f"cliente{c}@example.com"})
+                         for c in range(1, CUSTOMERS + 1)],
+        }
+        self.by_key = {(r["type"], r["id"]): r for rs in self.catalogs.values() for r in rs}
+
+    @staticmethod
+    def resource(type_name, id_, attributes, relationships=None):
+        r = {"type": type_name, "id": str(id_), "attributes": attributes}
+        if relationships:
+            r["relationships"] = relationships
+        return r
+
+    def select(self, created_from=None, updated_from=None):
+        """Indices of the sales matching the createdAt/updatedAt filters, in createdAt order."""
+        first = bisect_left(self.created, created_from) if created_from else 0
+        if not updated_from:
+            return range(first, self.n_sales)
+        return [i for i in range(first, self.n_sales) if self.updated[i] >= updated_from]
+
+    def sale(self, i):
+        """The sale at index ``i`` plus the page-local resources it owns, keyed by include path."""
+        rng = random.Random(self.seed * 1_000_003 + i)
+        sale_id = i + 1
+        created = START + i * SALE_INTERVAL
+        own = {"items": [], "items.subitems": [], "payments": [], "discounts": [], "tips": []}
+        total = 0
+        for n in range(rng.randint(1, 5)):
+            item_id = sale_id * 10 + n
+            price = rng.randint(1500, 9000)
+            quantity = rng.randint(1, 3)
+            canceled = rng.random() < 0.03
+            subitems = []
+            if rng.random() < 0.2:
+                sub_id = item_id * 10
+                subitems.append(ref("Subitem", sub_id))
+                own["items.subitems"].append(self.resource(
+                    "Subitem", sub_id, {"quantity": 1, "price": 0},
+                    {"product": {"data": ref("Product", rng.randint(1, PRODUCTS))}}))
+            own["items"].append(self.resource(
+                "Item", item_id, {"quantity": quantity, "price": price, "comment": None, "canceled": canceled},
+                {"product": {"data": ref("Product", rng.randint(1, PRODUCTS))},
+                 "subitems": {"data": subitems}}))
+            if not canceled:
+                total += price * quantity
+        discount = round(total * 0.1) if rng.random() < 0.08 else 0
+        tip = round(total * 0.1) if rng.random() < 0.25 else 0
+        if discount:
+            own["discounts"].append(self.resource("Discount", sale_id, {"amount": discount}))
+        if tip:
+            own["tips"].append(self.resource("Tip", sale_id, {"amount": tip}))
+        n_payments = 2 if rng.random() < 0.1 else 1
+        for n in range(n_payments):
+            own["payments"].append(self.resource(
+                "Payment", sale_id * 10 + n, {"amount": round((total - discount) / n_payments)},
+                {"paymentMethod": {"data": ref("PaymentMethod", rng.randint(1, len(PAYMENT_METHODS)))}}))
+        has_customer = rng.random() < 0.3
+        sale_state = "CANCELED" if rng.random() < 0.02 else "CLOSED"
+        if i in self.edited:
+            own["tips"].append(self.resource("Tip", sale_id * 10 + 1, {"amount": 500}))
+            sale_state = "CANCELED" if i % 3 == 0 else sale_state
+        sale = self.resource("Sale", sale_id, {
+            "createdAt": iso(created),
+            "closedAt": iso(created + timedelta(minutes=rng.randint(5, 90))),
+            "updatedAt": self.updated[i],
+            "total": total - discount,
+            "saleType": rng.choice(SALE_TYPES),
+            "saleState": sale_state,
+            "people": rng.randint(1, 6),
+            "comment": None,
+            "customerName": None,
+            "anonymousCustomer": None,
+        }, {name: {"data": [ref(r["type"], r["id"]) for r in own[name]]}
+            for name in ("items", "payments", "discounts", "tips")})
+        sale["relationships"]["waiter"] = {"data": ref("User", rng.randint(1, WAITERS))}
+        sale["relationships"]["customer"] = {"data": ref("Customer", rng.randint(1, CUSTOMERS)) if has_customer else None}
+        return sale, own
+
+    def sales_page(self, indices, include, fields):
+        """One JSON:API page with the sales at ``indices``."""
+        paths = set()
+        for path in filter(None, include.split(",")):
+            parts = path.split(".")
+            paths.update(".".join(parts[:n]) for n in range(1, len(parts) + 1))
+        data, included, seen = [], [], set()
+
+        def add(resource):
+            key = (resource["type"], resource["id"])
+            if key not in seen:
+                seen.add(key)
+                included.append(resource)
+
+        def add_ref(rel):
+            if rel:
+                add(self.by_key[(rel["type"], rel["id"])])
+
+        for i in indices:
+            sale, own = self.sale(i)
+            data.append(sale)
+            for path, resources in own.items():
+                if path in paths:
+                    for r in resources:
+                        add(r)
+            if "waiter" in paths:
+                add_ref(sale["relationships"]["waiter"]["data"])
+            if "customer" in paths:
+                add_ref(sale["relationships"]["customer"]["data"])
+            if "items.product" in paths:
+                for item in own["items"]:
+                    product_ref = item["relationships"]["product"]["data"]
+                    add_ref(product_ref)
+                    if "items.product.productCategory" in paths:
+                        add_ref(self.by_key[(product_ref["type"], product_ref["id"])]
+                                ["relationships"]["productCategory"]["data"])
+            if "items.subitems.product" in paths:
+                for sub in own["items.subitems"]:
+                    add_ref(sub["relationships"]["product"]["data"])
+            if "payments.paymentMethod" in paths:
+                for payment in own["payments"]:
+                    add_ref(payment["relationships"]["paymentMethod"]["data"])
+        return {"data": sparse(data, fields), "included": sparse(included, fields)}
+
+
+def sparse(resources, fields):
+    """Apply JSON:API sparse fieldsets (fields[Type]=a,b) to a list of resources."""
+    if not fields:
+        return resources
+    out = []
+    for r in resources:
+        keep = fields.get(r["type"])
+        if keep is None:
+            out.append(r)
+            continue
+        r = dict(r)
+        r["attributes"] = {k: v for k, v in r["attributes"].items() if k in keep}
+        if "relationships" in r:
+            r["relationships"] = {k: v for k, v in r["relationships"].items() if k in keep}
+        out.append(r)
+    return out
+
+
+CATALOG_PATHS = {
+    "/v1alpha1/products": "Product",
+    "/v1alpha1/product-categories": "ProductCategory",
+    "/v1alpha1/users": "User",
+    "/v1alpha1/payment-methods": "PaymentMethod",
+    "/v1alpha1/customers": "Customer",
+    "/v1alpha1/expenses": None,
+}
+
+
+class MockFudoServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, data, latency=0.0, token_ttl=3600.0, error_rate=0.0,
+                 meta_total=False, seed=0):
+        super().__init__(address, MockFudoHandler)
+        self.data = data
+        self.latency = latency
+        self.token_ttl = token_ttl
+        self.error_rate = error_rate
+        self.meta_total = meta_total
+        self.rng = random.Random(seed)
+        self.tokens = {}
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "bytes": 0, "status": {}}
+
+    def count(self, status, n_bytes):
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["bytes"] += n_bytes
+            self.stats["status"][str(status)] = self.stats["status"].get(str(status), 0) + 1
+
+
+class MockFudoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count(status, len(body))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        if urlparse(self.path).path != "/api":
+            return self.send_json(404, {"error": "not found"})
+        token = secrets.token_hex(16)
+        expires = time.time() + self.server.token_ttl
+        with self.server.lock:
+            self.server.tokens[token] = expires
+        self.send_json(200, {"token": token, "exp": int(expires)})
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        if url.path == "/_stats":
+            with server.lock:
+                stats = json.loads(json.dumps(server.stats))
+            return self.send_json(200, stats)
+
+        if server.latency:
+            time.sleep(server.latency)
+        token = (self.headers.get("Authorization") or "").removeprefix("Bearer ")
+        with server.lock:
+            expires = server.tokens.get(token)
+            fail = server.rng.random() < server.error_rate
+        if expires is None or expires < time.time():
+            return self.send_json(401, {"error": "token expired"})
+        if fail:
+            if server.rng.random() < 0.5:
+                return self.send_json(429, {"error": "rate limited"}, {"Retry-After": "1"})
+            return self.send_json(503, {"error": "unavailable"})
+
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        size = int(q.get("page[size]", 20))
+        number = int(q.get("page[number]", 1))
+        fields = {k[7:-1]: set(v.split(",")) for k, v in q.items() if k.startswith("fields[")}
+
+        if url.path in CATALOG_PATHS:
+            records = server.data.catalogs.get(CATALOG_PATHS[url.path], [])
+            return self.send_json(200, {"data": records[(number - 1) * size:number * size], "included": []})
+        if url.path != "/v1alpha1/sales":
+            return self.send_json(404, {"error": "not found"})
+
+        selected = server.data.select(q.get("filter[createdAt]", "").removeprefix("gte."),
+                                      q.get("filter[updatedAt]", "").removeprefix("gte."))
+        page = server.data.sales_page(selected[(number - 1) * size:number * size], q.get("include", ""), fields)
+        if server.meta_total:
+            page["meta"] = {"total": len(selected)}
+        self.send_json(200, page)
+
+
+def make_server(port=0, n_sales=10000, latency_ms=0.0, token_ttl=3600.0, error_rate=0.0,
+                meta_total=False, seed=0, host="127.0.0.1", revision=0):
+    return MockFudoServer((host, port), SyntheticData(n_sales, seed, revision), latency=latency_ms / 1000,
+                          token_ttl=token_ttl, error_rate=error_rate, meta_total=meta_total, seed=seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic FUDO API for local testing.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--sales", type=int, default=10000, help="number of synthetic sales (default: 10000)")
+    parser.add_argument("--latency", type=float, default=0.0, help="added latency per API request, in ms")
+    parser.add_argument("--token-ttl", type=float, default=3600.0,
+                        help="seconds until an issued token starts getting 401s (default: 3600)")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of API requests answered with 429 or 503 (default: 0)")
+    parser.add_argument("--meta-total", action="store_true", help="report meta.total on sales pages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--revision", type=int, default=0,
+                        help="apply N rounds of after-the-fact edits to recent sales (default: 0)")
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.sales, args.latency, args.token_ttl, args.error_rate,
+                         args.meta_total, args.seed, revision=args.revision)
+    host, port = server.server_address
+    print(f"Mock FUDO API with {args.sales} sales on http://{host}:{port}")
+    print(f"  FUDO_API_BASE=http://{host}:{port}/v1alpha1 FUDO_AUTH_URL=http://{host}:{port}/api")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
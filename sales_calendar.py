@@ -0,0 +1,157 @@
+"""
+sales_calendar.py — Calendar dimension for the sales frame.
+
+build_calendar() derives, once per distinct date, every date attribute the
+reports use: year, month, year_month, ISO week start and number, weekday,
+Spanish day and month labels, fiscal year/quarter and Colombian public
+holidays (fixed dates, the Ley Emiliani holidays moved to the next Monday and
+the Easter-based ones). add_calendar() maps it onto the item-level sales frame
+through the row's day, so date features cost O(distinct days) Python work
+instead of O(rows), and writes the label columns as categoricals.
+
+period_bounds() turns a reporting-period spec (a year, quarter, month, the
+last twelve months or an explicit range) into its first and last day.
+"""
+
+from datetime import date, timedelta
+
+import pandas as pd
+
+DAY_LABELS = ["Lunes", "Martes", "Miercoles", "Jueves", "Viernes", "Sabado", "Domingo"]
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MONTH_LABELS = ["Ene", "Feb", "Mar", "Abr", "May", "Jun", "Jul", "Ago", "Sep", "Oct", "Nov", "Dic"]
+
+FISCAL_YEAR_START_MONTH = 1  # Colombian fiscal year = calendar year
+
+CALENDAR_COLUMNS = [
+    "date", "year", "month_num", "year_month", "mes", "week", "iso_year", "iso_week",
+    "day_num", "day_of_week", "dia", "is_weekend",
+    "fiscal_year", "fiscal_quarter", "fiscal_period", "is_holiday", "holiday",
+]
+# Label columns add_calendar() writes as categoricals (sorted categories: year_month sorts chronologically).
+LABEL_COLUMNS = ["year_month", "mes", "day_of_week", "dia", "fiscal_period", "holiday"]
+# Columns add_calendar() writes on the sales frame, taken from the calendar of its day.
+SALES_COLUMNS = ["date", "day_of_week", "day_num", "dia", "year_month", "year", "month_num", "mes", "week",
+                 "is_holiday"]
+
+FIXED_HOLIDAYS = {
+    (1, 1): "Año Nuevo",
+    (5, 1): "Día del Trabajo",
+    (7, 20): "Día de la Independencia",
+    (8, 7): "Batalla de Boyacá",
+    (12, 8): "Inmaculada Concepción",
+    (12, 25): "Navidad",
+}
+# Ley Emiliani: observed on the following Monday.
+MONDAY_HOLIDAYS = {
+    (1, 6): "Reyes Magos",
+    (3, 19): "San José",
+    (6, 29): "San Pedro y San Pablo",
+    (8, 15): "Asunción de la Virgen",
+    (10, 12): "Día de la Raza",
+    (11, 1): "Todos los Santos",
+    (11, 11): "Independencia de Cartagena",
+}
+# Days from Easter Sunday (the Monday ones already moved).
+EASTER_HOLIDAYS = {
+    -3: "Jueves Santo",
+    -2: "Viernes Santo",
+    43: "Ascensión del Señor",
+    64: "Corpus Christi",
+    71: "Sagrado Corazón",
+}
+
+
+def easter(year):
+    """Easter Sunday (anonymous Gregorian algorithm)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def next_monday(d):
+    return d + timedelta(days=(7 - d.weekday()) % 7)
+
+
+def holidays(year):
+    """Colombian public holidays of ``year``: date -> name."""
+    days = {date(year, m, d): name for (m, d), name in FIXED_HOLIDAYS.items()}
+    for (m, d), name in MONDAY_HOLIDAYS.items():
+        days.setdefault(next_monday(date(year, m, d)), name)
+    sunday = easter(year)
+    for offset, name in EASTER_HOLIDAYS.items():
+        days.setdefault(sunday + timedelta(days=offset), name)
+    return days
+
+
+def build_calendar(days):
+    """One row per distinct date in ``days`` (dates or timestamps), indexed by date."""
+    days = sorted({pd.Timestamp(d).date() for d in days if not pd.isna(d)})
+    by_year = {year: holidays(year) for year in {d.year for d in days}}
+    rows = []
+    for d in days:
+        iso_year, iso_week, weekday = d.isocalendar()
+        fiscal_month = (d.month - FISCAL_YEAR_START_MONTH) % 12
+        fiscal_year = d.year + (1 if FISCAL_YEAR_START_MONTH > 1 and d.month >= FISCAL_YEAR_START_MONTH else 0)
+        holiday = by_year[d.year].get(d)
+        rows.append((
+            d, d.year, d.month, f"{d.year}-{d.month:02d}", MONTH_LABELS[d.month - 1],
+            d - timedelta(days=weekday - 1), iso_year, iso_week,
+            weekday - 1, DAY_NAMES[weekday - 1], DAY_LABELS[weekday - 1], weekday >= 6,
+            fiscal_year, fiscal_month // 3 + 1, f"FY{fiscal_year}-Q{fiscal_month // 3 + 1}",
+            holiday is not None, holiday or "",
+        ))
+    return pd.DataFrame(rows, columns=CALENDAR_COLUMNS, index=pd.Index(days, dtype=object))
+
+
+def add_calendar(df, column="created_at", columns=SALES_COLUMNS):
+    """Write the calendar ``columns`` of each row's day of ``column`` onto ``df``; returns the calendar."""
+    codes, days = pd.factorize(df[column].dt.normalize())
+    calendar = build_calendar(days)
+    aligned = calendar.reindex(days.date)
+    for name in columns:
+        if name in LABEL_COLUMNS:
+            labels = pd.Categorical(aligned[name], categories=sorted(calendar[name].unique()))
+            df[name] = pd.Categorical.from_codes(
+                pd.api.extensions.take(labels.codes, codes, allow_fill=True, fill_value=-1), dtype=labels.dtype)
+        else:
+            df[name] = pd.api.extensions.take(aligned[name].to_numpy(), codes, allow_fill=True)
+    return calendar
+
+
+def period_bounds(spec, last_day=None):
+    """(start, end) dates of a reporting period.
+
+    ``spec`` is a year ("2025"), a quarter ("2025-Q1"), a month ("2025-03"),
+    "ltm" (the twelve months up to ``last_day``, usually the last sales day) or
+    an explicit "YYYY-MM-DD:YYYY-MM-DD" range. Raises ValueError otherwise.
+    """
+    spec = spec.strip()
+    if spec.lower() == "ltm":
+        if last_day is None:
+            raise ValueError("ltm needs the last day of the data")
+        end = pd.Timestamp(last_day).date()
+        return (pd.Timestamp(end) - pd.DateOffset(years=1) + pd.Timedelta(days=1)).date(), end
+    if ":" in spec:
+        start, end = (date.fromisoformat(part) for part in spec.split(":", 1))
+    elif len(spec) == 4 and spec.isdigit():
+        start, end = date(int(spec), 1, 1), date(int(spec), 12, 31)
+    elif len(spec) == 7 and spec[4:6].upper() == "-Q" and spec[:4].isdigit() and spec[6] in "1234":
+        year, quarter = int(spec[:4]), int(spec[6])
+        start = date(year, 3 * quarter - 2, 1)
+        end = (pd.Timestamp(start) + pd.offsets.QuarterEnd(0)).date()
+    elif len(spec) == 7 and spec[4] == "-" and spec[:4].isdigit() and spec[5:].isdigit() and 1 <= int(spec[5:]) <= 12:
+        start = date(int(spec[:4]), int(spec[5:]), 1)
+        end = (pd.Timestamp(start) + pd.offsets.MonthEnd(0)).date()
+    else:
+        raise ValueError(f"unknown period {spec!r} (expected YYYY, YYYY-Qn, YYYY-MM, ltm or START:END)")
+    if end < start:
+        raise ValueError(f"period {spec!r} ends before it starts")
+    return start, end
@@ -0,0 +1,150 @@
+"""
+sales_cube.py — Additive aggregation cube of the enriched sales frame.
+
+build_cube() aggregates the sales frame once per grain into small tables whose
+measures are all sums (counts included), so any coarser breakdown is a sum of
+cube cells:
+
+    items     date × hour × sale_state × sale_type × waiter × category × product
+              line-item rows, quantity, revenue, cost, price, the same for the
+              items that carry a cost, and category_sales: each sale counted
+              once in every category it has items in
+    sales     date × hour × sale_state × sale_type × waiter
+              sales, totals, discounts, tips, and the sales with a valid duration
+    tickets   date × sale_state × sale_type × sale_total
+              sales per ticket amount (the distribution behind quantiles/histograms)
+    payments  date × sale_state × method
+              payments, distinct sales and amount per payment method
+
+Every sale falls in exactly one cell of the sales, tickets and payments grains,
+so sale counts stay additive; within one category, so does category_sales. slice_cube() keeps the cells of some sale states
+and a date range; rollup() sums a table by its grain columns and/or any column
+of the calendar dimension (year_month, week, dia, ...), mapped per date after a
+first roll-up by date so the calendar lookup costs O(days), not O(cells).
+Means are ratios of summed measures and quantiles come from weighted_quantile()
+over the tickets table.
+"""
+
+import numpy as np
+import pandas as pd
+
+import sales_calendar
+
+ITEM_GRAIN = ["date", "hour", "sale_state", "sale_type", "waiter_key", "category_key", "product_key"]
+SALE_GRAIN = ["date", "hour", "sale_state", "sale_type", "waiter_key"]
+TICKET_GRAIN = ["date", "sale_state", "sale_type", "sale_total"]
+PAYMENT_GRAIN = ["date", "sale_state", "method_key"]
+
+MEASURES = {
+    "items": ["items", "item_quantity", "item_revenue", "item_total_cost", "item_price",
+              "costed_items", "costed_quantity", "costed_revenue", "costed_cost", "category_sales"],
+    "sales": ["sales", "sale_total", "discount_total", "tips_total", "timed_sales", "timed_total", "timed_duration"],
+    "tickets": ["sales"],
+    "payments": ["payments", "sales", "amount"],
+}
+
+# Sales whose duration is used for averages (open or overnight tickets are left out).
+MIN_DURATION, MAX_DURATION = 0, 480
+
+
+def _aggregate(frame, grain, table):
+    return frame.groupby(grain, observed=True, dropna=False)[MEASURES[table]].sum().reset_index()
+
+
+def build_cube(df, payments=None):
+    """The cube of an enriched sales frame (and its exploded payments, with method_key), as a dict of tables."""
+    costed = df["item_cost"] > 0
+    items = pd.DataFrame({
+        **{col: df[col] for col in ITEM_GRAIN},
+        "items": 1,
+        "item_quantity": df["item_quantity"],
+        "item_revenue": df["item_revenue"],
+        "item_total_cost": df["item_total_cost"],
+        "item_price": df["item_price"],
+        "costed_items": costed.astype("int64"),
+        "costed_quantity": df["item_quantity"].where(costed, 0.0),
+        "costed_revenue": df["item_revenue"].where(costed, 0.0),
+        "costed_cost": df["item_total_cost"].where(costed, 0.0),
+        # The first line of a sale in its category: distinct sales per category add up over the other columns.
+        "category_sales": (~df.duplicated(subset=["sale_id", "category_key"])).astype("int64"),
+    })
+
+    first = df.drop_duplicates(subset="sale_id")
+    timed = (first["duration_min"] > MIN_DURATION) & (first["duration_min"] < MAX_DURATION)
+    sales = pd.DataFrame({
+        **{col: first[col] for col in SALE_GRAIN + ["sale_total"]},
+        "sales": 1,
+        "discount_total": first["discount_total"],
+        "tips_total": first["tips_total"],
+        "timed_sales": timed.astype("int64"),
+        "timed_total": first["sale_total"].where(timed, 0.0),
+        "timed_duration": first["duration_min"].where(timed, 0.0),
+    })
+
+    cube = {
+        "items": _aggregate(items, ITEM_GRAIN, "items"),
+        "sales": _aggregate(sales, SALE_GRAIN, "sales"),
+        "tickets": _aggregate(sales, TICKET_GRAIN, "tickets"),
+    }
+
+    if payments is not None and not payments.empty:
+        states = first.set_index("sale_id")["sale_state"]
+        payments = pd.DataFrame({
+            "date": payments["date"],
+            "sale_state": payments["sale_id"].map(states),
+            "method_key": payments["method_key"],
+            "payments": 1,
+            # A sale paying twice with one method counts once for that method.
+            "sales": (~payments.duplicated(subset=["sale_id", "method_key"])).astype("int64"),
+            "amount": payments["amount"],
+        })
+        cube["payments"] = _aggregate(payments, PAYMENT_GRAIN, "payments")
+    else:
+        cube["payments"] = pd.DataFrame(columns=PAYMENT_GRAIN + MEASURES["payments"])
+
+    cube["calendar"] = sales_calendar.build_calendar(cube["sales"]["date"].dropna().unique())
+    return cube
+
+
+def slice_cube(cube, states=None, start=None, end=None):
+    """The cells of ``cube`` with a sale state in ``states`` and a date in [start, end] (None: no bound)."""
+    calendar = cube["calendar"]
+    in_range = pd.Series(True, index=calendar.index)
+    if start is not None:
+        in_range &= calendar["date"] >= start
+    if end is not None:
+        in_range &= calendar["date"] <= end
+    days = calendar.index[in_range]
+    sliced = {"calendar": calendar[in_range]}
+    for table in MEASURES:
+        frame = cube[table]
+        keep = frame["date"].isin(days)
+        if states is not None:
+            keep &= frame["sale_state"].isin(states)
+        sliced[table] = frame[keep].reset_index(drop=True)
+    return sliced
+
+
+def rollup(cube, table, by, measures=None):
+    """Sum ``measures`` (default: all) of cube ``table`` by ``by``: grain and/or calendar columns."""
+    frame = cube[table]
+    measures = measures or MEASURES[table]
+    keys = [col for col in by if col in frame]
+    derived = [col for col in by if col not in frame]
+    if derived:
+        frame = frame.groupby(keys + ["date"], observed=True)[measures].sum().reset_index()
+        for col in derived:
+            frame[col] = frame["date"].map(cube["calendar"][col])
+    if not by:
+        return frame[measures].sum()
+    return frame.groupby(by, observed=True)[measures].sum().reset_index()
+
+
+def weighted_quantile(values, counts, q):
+    """Linearly interpolated quantile (as Series.quantile) of sorted ``values`` repeated ``counts`` times."""
+    values, cum = np.asarray(values), np.cumsum(np.asarray(counts))
+    position = q * (cum[-1] - 1)
+    lo = int(np.floor(position))
+    below = values[np.searchsorted(cum, lo, side="right")]
+    above = values[np.searchsorted(cum, min(lo + 1, cum[-1] - 1), side="right")]
+    return float(below + (above - below) * (position - lo))
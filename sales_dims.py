@@ -0,0 +1,103 @@
+"""
+sales_dims.py — Integer surrogate keys and label dimensions for the sales frame.
+
+The extractor writes product_id, category_id, waiter_id and payment_method_ids
+on every fudo_sales.csv row, and convert_reference_data.py writes the matching
+dimension CSVs (fudo_products.csv with each product's category_id,
+fudo_categories.csv, fudo_users.csv, fudo_payment_methods.csv).
+
+add_keys() gives the sales frame one int64 key column per dimension, so
+build_static.py and dashboard.py group on small ints, and label() swaps the
+keys of an aggregated frame for their display names afterwards. Labels come
+from the dimension tables (the current name, so a renamed product keeps one
+key) and fall back to the name on the sales rows. Rows without an id (extracts
+older than the id columns, or entities missing from the catalogs) are matched
+to the dimension by name, else given a negative key per distinct name.
+Key 0 is "none" and carries the default label.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+
+# kind -> (id column, name column, key column, dimension CSV, its id column, default label)
+DIMENSIONS = {
+    "product": ("product_id", "product_name", "product_key", "fudo_products.csv", "product_id", "Sin Producto"),
+    "category": ("category_id", "product_category", "category_key", "fudo_categories.csv", "category_id",
+                 "Sin Categoria"),
+    "waiter": ("waiter_id", "waiter", "waiter_key", "fudo_users.csv", "user_id", "Sin Asignar"),
+    "method": ("method_id", "method", "method_key", "fudo_payment_methods.csv", "payment_method_id", ""),
+}
+SALES_KINDS = ["product", "category", "waiter"]
+
+
+def load_dimension(filename, id_col, columns=("name",), base=BASE):
+    """A dimension CSV indexed by its integer id (empty if it has not been converted yet)."""
+    path = os.path.join(base, filename)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=list(columns), index=pd.Index([], dtype="int64"))
+    dim = pd.read_csv(path, usecols=lambda c: c == id_col or c in columns)
+    dim[id_col] = pd.to_numeric(dim[id_col], errors="coerce")
+    return dim.dropna(subset=[id_col]).astype({id_col: "int64"}).set_index(id_col)
+
+
+def _keys(df, kind, dim, fallback_ids=None):
+    id_col, name_col, key_col, _, _, default = DIMENSIONS[kind]
+    names = df[name_col].astype(object) if name_col in df else pd.Series(np.nan, index=df.index, dtype=object)
+    if id_col in df:
+        ids = pd.to_numeric(df[id_col], errors="coerce")
+    else:
+        ids = pd.Series(np.nan, index=df.index)
+    if fallback_ids is not None:
+        ids = ids.fillna(fallback_ids)
+
+    missing = ids.isna() & names.notna()
+    if missing.any():
+        by_name = pd.Series(dim.index, index=dim["name"].values)
+        by_name = by_name[~by_name.index.duplicated(keep="last")]
+        ids[missing] = names[missing].map(by_name)
+        unknown = ids.isna() & names.notna()
+        codes, _ = pd.factorize(names[unknown])
+        ids[unknown] = -(codes + 1)
+    keys = ids.fillna(0).astype("int64")
+    df[key_col] = keys
+
+    seen = names.groupby(keys).last()
+    labels = pd.concat([seen, dim["name"]])
+    labels = labels[~labels.index.duplicated(keep="last")].dropna()
+    labels.loc[0] = default
+    return labels
+
+
+def add_keys(df, kinds=SALES_KINDS, base=BASE):
+    """Add the key column of each of ``kinds`` to ``df`` in place; returns {kind: labels by key}.
+
+    Categories the sales rows don't carry are taken from the product dimension.
+    """
+    labels = {}
+    products = None
+    for kind in kinds:
+        _, _, key_col, filename, dim_id, _ = DIMENSIONS[kind]
+        columns = ("name", "category_id") if kind == "product" else ("name",)
+        dim = load_dimension(filename, dim_id, columns, base)
+        if kind == "product":
+            products = dim
+        fallback = None
+        if kind == "category" and products is not None and "category_id" in products:
+            fallback = df["product_key"].map(pd.to_numeric(products["category_id"], errors="coerce"))
+        labels[kind] = _keys(df, kind, dim, fallback)
+    return labels
+
+
+def label(frame, labels):
+    """Replace every key column of an aggregated ``frame`` with its name column, in place of the key."""
+    for kind, (_, name_col, key_col, _, _, default) in DIMENSIONS.items():
+        if key_col in frame and kind in labels:
+            names = frame[key_col].map(labels[kind]).fillna(default)
+            position = frame.columns.get_loc(key_col)
+            frame = frame.drop(columns=key_col)
+            frame.insert(position, name_col, names)
+    return frame
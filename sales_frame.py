@@ -0,0 +1,267 @@
+"""
+sales_frame.py — Sales-frame loading and transformations shared by build_static.py and dashboard.py.
+
+read_sales_csv() parses fudo_sales.csv to the declared SALES_SCHEMA: the
+names repeated on every line item (sale type and state, waiter, product,
+category, payment methods, customer) as categoricals, ids as nullable ints,
+amounts as floats. It uses pyarrow's multithreaded CSV reader when installed
+and pandas' C engine otherwise, with the same resulting dtypes.
+
+load_sales() returns the enriched sales frame: fudo_sales.csv parsed, with the
+calendar columns of sales_calendar, the derived numeric and margin columns and
+the integer dimension keys of sales_dims. The first load saves it to fudo_sales_enriched.parquet, with a
+sidecar fudo_sales_enriched.json recording the labels and the mtime, size and
+SHA-256 of every input (the CSV and the dimension CSVs). Later loads read the
+Parquet file as long as the inputs are unchanged: a changed mtime only costs a
+re-hash, a changed hash rebuilds the artifact. Without pyarrow the frame is
+rebuilt from the CSV every time.
+
+explode_payments() turns the pipe-joined payment columns of the sales rows
+(payment_methods, payment_amounts, payment_method_ids) into a long-form
+payments table with one typed row per payment, using columnar string
+split/explode operations instead of a Python loop over the sales.
+"""
+
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+import sales_calendar
+import sales_dims
+
+try:
+    import pyarrow  # pandas' Parquet engine, and the multithreaded CSV reader
+    import pyarrow.csv
+except ImportError:  # no artifact, C-engine CSV parse and enrich on every load
+    pyarrow = None
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+SALES_CSV = os.path.join(BASE, "fudo_sales.csv")
+ENRICHED = os.path.join(BASE, "fudo_sales_enriched.parquet")
+ENRICHED_VERSION = 3  # bump when enrich() or SALES_SCHEMA changes, to invalidate saved artifacts
+
+# Declared dtypes of fudo_sales.csv. The names repeated on every line item are
+# categoricals (int codes + one copy of each name), ids are nullable ints and
+# free text stays string; columns an older extract lacks are simply absent.
+SALES_DATES = ["created_at", "closed_at"]
+SALES_SCHEMA = {
+    "sale_id": "int64",
+    "sale_total": "float64",
+    "sale_type": "category",
+    "sale_state": "category",
+    "people": "Int64",
+    "comment": "string",
+    "customer_name": "category",
+    "customer_phone": "category",
+    "customer_email": "category",
+    "waiter_id": "Int64",
+    "waiter": "category",
+    "discount_total": "float64",
+    "tips_total": "float64",
+    "payment_method_ids": "category",
+    "payment_methods": "category",
+    "payment_amounts": "string",
+    "product_id": "Int64",
+    "product_name": "category",
+    "category_id": "Int64",
+    "product_category": "category",
+    "item_quantity": "float64",
+    "item_price": "float64",
+    "item_cost": "float64",
+    "item_comment": "string",
+    "item_canceled": "boolean",
+    "subitems": "category",
+}
+
+PAYMENT_COLUMNS = ["sale_id", "date", "year_month", "method_id", "method", "amount"]
+
+
+def _arrow_type(dtype):
+    if dtype == "category":
+        return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    return {"int64": pyarrow.int64(), "Int64": pyarrow.int64(), "float64": pyarrow.float64(),
+            "string": pyarrow.string(), "boolean": pyarrow.bool_()}[dtype]
+
+
+def _read_arrow(path):
+    types = {col: _arrow_type(dtype) for col, dtype in SALES_SCHEMA.items()}
+    types.update({col: pyarrow.timestamp("us", tz="UTC") for col in SALES_DATES})
+    table = pyarrow.csv.read_csv(path, convert_options=pyarrow.csv.ConvertOptions(
+        column_types=types, strings_can_be_null=True))
+    nullable = {pyarrow.int64(): pd.Int64Dtype(), pyarrow.bool_(): pd.BooleanDtype(),
+                pyarrow.string(): pd.StringDtype()}
+    df = table.to_pandas(types_mapper=nullable.get)
+    for col in SALES_DATES:
+        df[col] = df[col].dt.tz_localize(None)
+    return df.astype({col: dtype for col, dtype in SALES_SCHEMA.items() if col in df and dtype != "category"})
+
+
+def read_sales_csv(path=SALES_CSV):
+    """fudo_sales.csv parsed to SALES_SCHEMA, with pyarrow's CSV reader when installed."""
+    if pyarrow is not None:
+        df = _read_arrow(path)
+    else:
+        df = pd.read_csv(path, dtype=SALES_SCHEMA, low_memory=False)
+        for col in SALES_DATES:
+            df[col] = pd.to_datetime(df[col], errors="coerce", utc=True).dt.tz_localize(None)
+    # Same sorted categories whichever reader ran (pyarrow keeps first-seen order).
+    for col, dtype in SALES_SCHEMA.items():
+        if dtype == "category" and col in df:
+            df[col] = df[col].cat.set_categories(sorted(df[col].cat.categories))
+    return df
+
+
+def enrich(df, base=BASE):
+    """Add the derived columns and dimension keys to a parsed sales frame; returns the labels."""
+    # date, week, year_month, Spanish labels, holidays...: computed once per day and mapped onto the rows.
+    sales_calendar.add_calendar(df)
+    df["hour"] = df["created_at"].dt.hour
+
+    df["item_quantity"] = pd.to_numeric(df["item_quantity"], errors="coerce").fillna(0)
+    df["item_price"] = pd.to_numeric(df["item_price"], errors="coerce").fillna(0)
+    df["item_cost"] = pd.to_numeric(df["item_cost"], errors="coerce").fillna(0)
+    df["sale_total"] = pd.to_numeric(df["sale_total"], errors="coerce").fillna(0)
+    df["discount_total"] = pd.to_numeric(df["discount_total"], errors="coerce").fillna(0)
+    df["tips_total"] = pd.to_numeric(df["tips_total"], errors="coerce").fillna(0)
+
+    df["item_revenue"] = df["item_price"] * df["item_quantity"]
+    df["item_total_cost"] = df["item_cost"] * df["item_quantity"]
+    df["item_margin"] = df["item_revenue"] - df["item_total_cost"]
+    df["duration_min"] = (df["closed_at"] - df["created_at"]).dt.total_seconds() / 60
+
+    # Integer product/category/waiter keys to group on; labels are attached to the aggregates.
+    labels = sales_dims.add_keys(df, base=base)
+
+    df["product_category"] = _fillna(df["product_category"], "Sin Categoria")
+    df["waiter"] = _fillna(df["waiter"], "Sin Asignar")
+    df["sale_type"] = _fillna(df["sale_type"], "UNKNOWN")
+    df["sale_state"] = _fillna(df["sale_state"], "UNKNOWN")
+    df["product_name"] = _fillna(df["product_name"], "Sin Producto")
+    return labels
+
+
+def _fillna(values, default):
+    """fillna that first adds ``default`` to the (kept sorted) categories of a categorical."""
+    if isinstance(values.dtype, pd.CategoricalDtype) and values.hasnans:
+        values = values.cat.set_categories(sorted(values.cat.categories.union([default])))
+    return values.fillna(default)
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def sources(path=SALES_CSV, base=BASE):
+    """The files the enriched frame is derived from: the sales CSV and the dimension CSVs."""
+    return [path] + [os.path.join(base, sales_dims.DIMENSIONS[kind][3]) for kind in sales_dims.SALES_KINDS]
+
+
+def fingerprint(path, known=None):
+    """mtime, size and hash of ``path`` (None if missing); the hash is reused from ``known`` if mtime/size match."""
+    if not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    if known and known["mtime"] == st.st_mtime and known["size"] == st.st_size:
+        return known
+    return {"mtime": st.st_mtime, "size": st.st_size, "sha256": file_hash(path)}
+
+
+def _sidecar(artifact):
+    return os.path.splitext(artifact)[0] + ".json"
+
+
+def _load_artifact(artifact, inputs):
+    """(df, labels) from a saved artifact whose inputs still hash the same, else None."""
+    if not (os.path.exists(artifact) and os.path.exists(_sidecar(artifact))):
+        return None
+    with open(_sidecar(artifact), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") != ENRICHED_VERSION or sorted(meta.get("sources", {})) != sorted(inputs):
+        return None
+    fingerprints = {}
+    for path in inputs:
+        known = meta["sources"][path]
+        current = fingerprints[path] = fingerprint(path, known)
+        if (current and current["sha256"]) != (known and known["sha256"]):
+            return None
+    if fingerprints != meta["sources"]:
+        # Touched but identical inputs: remember the new mtimes so the next load skips hashing.
+        _save_sidecar(artifact, {**meta, "sources": fingerprints})
+    df = pd.read_parquet(artifact)
+    labels = {kind: pd.Series(list(values.values()), index=pd.Index([int(key) for key in values], dtype="int64"))
+              for kind, values in meta["labels"].items()}
+    return df, labels
+
+
+def _save_sidecar(artifact, meta):
+    tmp = _sidecar(artifact) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp, _sidecar(artifact))
+
+
+def load_sales(path=SALES_CSV, artifact=ENRICHED, base=BASE):
+    """The enriched sales frame and its dimension labels, from the saved artifact when it is current."""
+    inputs = sources(path, base)
+    if pyarrow is not None:
+        cached = _load_artifact(artifact, inputs)
+        if cached is not None:
+            return cached
+
+    fingerprints = {p: fingerprint(p) for p in inputs}
+    df = read_sales_csv(path)
+    labels = enrich(df, base)
+    if pyarrow is not None:
+        tmp = artifact + ".tmp"
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, artifact)
+        _save_sidecar(artifact, {
+            "version": ENRICHED_VERSION,
+            "sources": fingerprints,
+            "labels": {kind: {str(key): value for key, value in series.items()} for kind, series in labels.items()},
+        })
+    return df, labels
+
+
+def _split_long(values, name):
+    """Split a pipe-joined column into one row per element, indexed by (row, position)."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Split each distinct value once; the trailing [""] is what code -1 (missing) picks.
+        split = pd.Series(values.cat.categories.astype(str).str.split("|").tolist() + [[""]]).to_numpy()
+        parts = pd.Series(split[values.cat.codes.to_numpy()], index=values.index).explode()
+    else:
+        parts = values.fillna("").astype(str).str.split("|").explode()
+    rows = parts.index.to_numpy()
+    parts.index = pd.MultiIndex.from_arrays([rows, parts.groupby(level=0).cumcount().to_numpy()])
+    return parts.rename(name)
+
+
+def explode_payments(sales):
+    """Long-form payments of ``sales`` (one row per sale, as in unique_sales).
+
+    Methods and amounts are paired by position (extra elements of either are
+    dropped), blank methods are skipped and unparseable amounts count as 0.
+    Columns: sale_id, date, year_month, method_id (nullable int), method, amount (float).
+    """
+    sales = sales.reindex(columns=["sale_id", "date", "year_month", "payment_methods", "payment_amounts",
+                                   "payment_method_ids"]).reset_index(drop=True)
+    long = pd.concat([_split_long(sales["payment_methods"], "method"),
+                      _split_long(sales["payment_amounts"], "amount")], axis=1, join="inner")
+    long["method"] = long["method"].str.strip()
+    long = long[long["method"] != ""]
+    ids = _split_long(sales["payment_method_ids"], "method_id").reindex(long.index)
+
+    rows = long.index.get_level_values(0)
+    payments = sales[["sale_id", "date", "year_month"]].take(rows).reset_index(drop=True)
+    payments["method_id"] = pd.to_numeric(ids.to_numpy(), errors="coerce")
+    payments["method_id"] = payments["method_id"].astype("Int64")
+    payments["method"] = long["method"].to_numpy()
+    payments["amount"] = pd.to_numeric(long["amount"].str.strip().to_numpy(), errors="coerce")
+    payments["amount"] = payments["amount"].fillna(0.0).astype("float64")
+    return payments
@@ -0,0 +1,167 @@
+"""
+sales_star.py — Normalized Parquet star schema for the FUDO sales extract.
+
+Tables (one Parquet file each under fudo_star/):
+    sales          one row per sale (sale-level fields, no line-item repetition)
+    sale_items     one row per line item, keyed by item_id / sale_id
+    sale_payments  one row per payment, keyed by payment_id / sale_id
+    item_subitems  one row per modifier, keyed by subitem_id / item_id
+
+Ids are int64 and low-cardinality strings are dictionary-encoded, so readers
+can load just the tables and columns they need with read_star_table().
+"""
+
+import os
+import shutil
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+STAR_DIR = os.path.join(BASE, "fudo_star")
+
+TIMESTAMP = pa.timestamp("us", tz="UTC")
+DICT_STRING = pa.dictionary(pa.int32(), pa.string())
+
+SCHEMAS = {
+    "sales": pa.schema([
+        ("sale_id", pa.int64()),
+        ("created_at", TIMESTAMP),
+        ("closed_at", TIMESTAMP),
+        ("sale_total", pa.float64()),
+        ("sale_type", DICT_STRING),
+        ("sale_state", DICT_STRING),
+        ("people", pa.int32()),
+        ("comment", pa.string()),
+        ("customer_id", pa.int64()),
+        ("customer_name", pa.string()),
+        ("customer_phone", pa.string()),
+        ("customer_email", pa.string()),
+        ("waiter_id", pa.int64()),
+        ("waiter", DICT_STRING),
+        ("discount_total", pa.float64()),
+        ("tips_total", pa.float64()),
+    ]),
+    "sale_items": pa.schema([
+        ("item_id", pa.int64()),
+        ("sale_id", pa.int64()),
+        ("product_id", pa.int64()),
+        ("product_name", DICT_STRING),
+        ("category_id", pa.int64()),
+        ("product_category", DICT_STRING),
+        ("quantity", pa.float64()),
+        ("price", pa.float64()),
+        ("cost", pa.float64()),
+        ("comment", pa.string()),
+        ("canceled", pa.bool_()),
+    ]),
+    "sale_payments": pa.schema([
+        ("payment_id", pa.int64()),
+        ("sale_id", pa.int64()),
+        ("payment_method_id", pa.int64()),
+        ("payment_method", DICT_STRING),
+        ("amount", pa.float64()),
+    ]),
+    "item_subitems": pa.schema([
+        ("subitem_id", pa.int64()),
+        ("item_id", pa.int64()),
+        ("sale_id", pa.int64()),
+        ("product_id", pa.int64()),
+        ("product_name", DICT_STRING),
+        ("quantity", pa.float64()),
+        ("price", pa.float64()),
+    ]),
+}
+TABLES = list(SCHEMAS)
+
+PARTS_PER_ROW_GROUP = 64
+
+
+def to_arrow(name, records):
+    """Build a typed Arrow table from parsed records (timestamps arrive as ISO strings)."""
+    schema = SCHEMAS[name]
+    columns = []
+    for field in schema:
+        values = [r.get(field.name) for r in records]
+        if field.type == TIMESTAMP:
+            arr = pa.array(values, type=pa.string()).cast(TIMESTAMP)
+        elif field.type == DICT_STRING:
+            arr = pa.array(values, type=pa.string()).dictionary_encode()
+        else:
+            arr = pa.array(values, type=field.type)
+        columns.append(arr)
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+class StarWriter:
+    """Writes each page's normalized records as one Parquet part per table, then
+    compacts the parts into a single file per table when the run finishes.
+
+    One part per page keeps the star output in lockstep with the CSV checkpoint:
+    on resume, parts past the committed page count are simply deleted.
+    """
+
+    def __init__(self, directory=STAR_DIR, resume_parts=None):
+        self.directory = directory
+        self.parts = 0
+        if resume_parts is not None:
+            self.parts = resume_parts
+            for name in TABLES:
+                part_dir = os.path.join(directory, name)
+                for fname in os.listdir(part_dir) if os.path.isdir(part_dir) else []:
+                    if int(fname.split("-")[1].split(".")[0]) >= resume_parts:
+                        os.remove(os.path.join(part_dir, fname))
+        else:
+            for name in TABLES:
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+        for name in TABLES:
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+
+    def write_page(self, tables):
+        for name in TABLES:
+            path = os.path.join(self.directory, name, f"part-{self.parts:06d}.parquet")
+            pq.write_table(to_arrow(name, tables.get(name, [])), path)
+        self.parts += 1
+
+    def finalize(self):
+        """Compact the per-page parts of every table into <table>.parquet."""
+        for name in TABLES:
+            part_dir = os.path.join(self.directory, name)
+            parts = sorted(os.listdir(part_dir))
+            tmp = os.path.join(self.directory, f"{name}.parquet.tmp")
+            with pq.ParquetWriter(tmp, SCHEMAS[name]) as writer:
+                for i in range(0, len(parts), PARTS_PER_ROW_GROUP):
+                    chunk = [pq.read_table(os.path.join(part_dir, p)) for p in parts[i:i + PARTS_PER_ROW_GROUP]]
+                    writer.write_table(pa.concat_tables(chunk).combine_chunks())
+            os.replace(tmp, os.path.join(self.directory, f"{name}.parquet"))
+            shutil.rmtree(part_dir)
+
+
+def merge_star(delta_dir, directory=STAR_DIR, sale_ids=None):
+    """Upsert a finalized delta star schema into the main one by sale_id.
+
+    ``sale_ids`` restricts the upsert to those sales (the new or changed ones);
+    by default every sale in the delta is applied.
+    """
+    if sale_ids is None:
+        delta_ids = pq.read_table(os.path.join(delta_dir, "sales.parquet"), columns=["sale_id"]).column("sale_id")
+    else:
+        delta_ids = pa.array(sale_ids, type=pa.int64())
+    for name in TABLES:
+        path = os.path.join(directory, f"{name}.parquet")
+        delta = pq.read_table(os.path.join(delta_dir, f"{name}.parquet"))
+        if sale_ids is not None:
+            delta = delta.filter(pc.is_in(delta.column("sale_id"), value_set=delta_ids))
+        if os.path.exists(path):
+            base = pq.read_table(path)
+            base = base.filter(pc.invert(pc.is_in(base.column("sale_id"), value_set=delta_ids)))
+            delta = pa.concat_tables([base, delta])
+        pq.write_table(delta.combine_chunks(), path + ".tmp")
+        os.replace(path + ".tmp", path)
+    shutil.rmtree(delta_dir)
+
+
+def read_star_table(name, columns=None, directory=STAR_DIR):
+    """Load one star-schema table as a DataFrame, reading only the requested columns."""
+    return pq.read_table(os.path.join(directory, f"{name}.parquet"), columns=columns).to_pandas()